@@ -0,0 +1,89 @@
+"""Minimum cost assignment for batch dispatching"""
+
+from typing import List, Optional, Sequence
+
+
+def min_cost_assignment(costs: Sequence[Sequence[float]]) \
+        -> List[Optional[int]]:
+    """Return an assignment of the rows of the cost matrix <costs> to its
+    columns with the lowest total cost, as the column of each row, or None
+    for the rows left unassigned.
+
+    As many rows are assigned as there are rows or columns, whichever is
+    fewer, and no two rows to the same column. This is the Hungarian
+    algorithm, which takes O(n * n * m) time for n rows and m columns, or
+    m rows and n columns.
+
+    Precondition: every row of <costs> has the same length.
+
+    >>> min_cost_assignment([[4, 1, 3], [2, 0, 5], [3, 2, 2]])
+    [1, 0, 2]
+    >>> min_cost_assignment([[1], [0], [5]])
+    [None, 0, None]
+    >>> min_cost_assignment([])
+    []
+    """
+    if not costs or not costs[0]:
+        return [None] * len(costs)
+    if len(costs) > len(costs[0]):
+        # Assign the columns to the rows instead.
+        columns = min_cost_assignment(list(zip(*costs)))
+        rows = [None] * len(costs)
+        for column, row in enumerate(columns):
+            rows[row] = column
+        return rows
+
+    n, m = len(costs), len(costs[0])
+    inf = float('inf')
+    # Potentials of the rows and columns, and the row assigned to each
+    # column, with a dummy column 0 and rows counted from 1.
+    row_potential = [0] * (n + 1)
+    column_potential = [0] * (m + 1)
+    owner = [0] * (m + 1)
+    previous = [0] * (m + 1)
+    for row in range(1, n + 1):
+        owner[0] = row
+        column = 0
+        slack = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while owner[column] != 0:
+            used[column] = True
+            current = owner[column]
+            row_costs = costs[current - 1]
+            delta = inf
+            following = 0
+            for other in range(1, m + 1):
+                if not used[other]:
+                    reduced = row_costs[other - 1] - \
+                        row_potential[current] - column_potential[other]
+                    if reduced < slack[other]:
+                        slack[other] = reduced
+                        previous[other] = column
+                    if slack[other] < delta:
+                        delta = slack[other]
+                        following = other
+            for other in range(m + 1):
+                if used[other]:
+                    row_potential[owner[other]] += delta
+                    column_potential[other] -= delta
+                else:
+                    slack[other] -= delta
+            column = following
+
+        # Augment along the alternating path that ends at <column>.
+        while column != 0:
+            before = previous[column]
+            owner[column] = owner[before]
+            column = before
+
+    assignment = [None] * n
+    for column in range(1, m + 1):
+        if owner[column]:
+            assignment[owner[column] - 1] = column - 1
+    return assignment
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={'extra-imports': ['typing']})
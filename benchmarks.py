@@ -0,0 +1,388 @@
+"""
+The benchmarks module measures the performance of the simulation's hot
+paths: the event queues, the dispatcher, the monitor, the trace parser and
+whole simulation runs.
+
+Every benchmark is timed at one or more sizes, and the results can be
+written as JSON and compared against a stored baseline, so that
+regressions are caught. Run it from the command line:
+
+    python benchmarks.py --sizes 1000 100000 --output results.json \
+        --baseline baseline.json
+
+The committed baseline.json is the reference run of
+
+    python benchmarks.py --sizes 1000 10000 --repeat 7 --output baseline.json
+
+Its timings only hold for the machine it was taken on, which it records,
+so rewrite it with the same command before comparing on other hardware.
+
+With --dispatch, the per-event dispatcher is also compared with batch
+dispatchers at a few intervals, on both throughput and rider wait time.
+
+The inputs of every benchmark come from a seeded workload.Workload, so
+they are the same from one run to the next.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Sequence
+from container import CalendarQueue, PriorityQueue
+from dispatcher import Dispatcher, BatchDispatcher
+from event import create_event_list
+from monitor import Monitor, StreamingMonitor, RIDER, DRIVER, REQUEST, \
+    PICKUP, DROPOFF
+from simulation import Simulation
+from workload import Hotspot, Workload
+
+Results = Dict[str, Dict[str, Dict[str, float]]]
+
+
+def workload(size: int) -> Workload:
+    """Return the workload used by the benchmarks of <size> events.
+
+    The fleet is a tenth of the riders, on a grid that grows with the
+    square root of the size, and a third of the riders come from a hotspot.
+    """
+    side = max(10, int(size ** 0.5))
+    drivers = max(1, size // 11)
+    return Workload(rows=side, columns=side, drivers=drivers,
+                    riders=size - drivers, arrival_rate=max(1.0, size / 1000),
+                    hotspots=[Hotspot(side // 4, side // 4, 0.5, side / 20)],
+                    seed=size)
+
+
+def bench_priority_queue(size: int) -> float:
+    """Return the time to add and then remove <size> events with a
+    PriorityQueue.
+
+    """
+    return _bench_queue(PriorityQueue(), size)
+
+
+def bench_calendar_queue(size: int) -> float:
+    """Return the time to add and then remove <size> events with a
+    CalendarQueue.
+
+    """
+    return _bench_queue(CalendarQueue(), size)
+
+
+def _bench_queue(queue: object, size: int) -> float:
+    """Return the time to add and then remove <size> events with <queue>.
+
+    """
+    events = list(workload(size).events())
+    start = perf_counter()
+    for event in events:
+        queue.add(event)
+    while not queue.is_empty():
+        queue.remove()
+    return perf_counter() - start
+
+
+def bench_request_driver(size: int) -> float:
+    """Return the time for the riders of a workload of <size> events to
+    request a driver, with every driver registered and idle.
+
+    """
+    dispatcher, riders = _registered_dispatcher(size)
+    start = perf_counter()
+    for rider in riders:
+        driver = dispatcher.request_driver(rider)
+        if driver is not None:
+            # Put the driver back, so that every request searches the fleet.
+            driver.is_idle = True
+            dispatcher.update_driver(driver)
+    return perf_counter() - start
+
+
+def bench_request_rider(size: int) -> float:
+    """Return the time for the drivers of a workload of <size> events to
+    request a rider, with every rider waiting, until either runs out.
+
+    """
+    dispatcher = Dispatcher()
+    drivers, riders = _actors(size)
+    for rider in riders:
+        dispatcher.request_driver(rider)
+    start = perf_counter()
+    while not dispatcher.riders_waiting_list.is_empty():
+        for driver in drivers:
+            driver.is_idle = True
+            if dispatcher.request_rider(driver) is None:
+                break
+    return perf_counter() - start
+
+
+def bench_cancel_ride(size: int) -> float:
+    """Return the time for every second waiting rider of a workload of
+    <size> events to cancel.
+
+    """
+    dispatcher = Dispatcher()
+    _, riders = _actors(size)
+    for rider in riders:
+        dispatcher.request_driver(rider)
+    start = perf_counter()
+    for rider in riders[::2]:
+        dispatcher.cancel_ride(rider)
+    return perf_counter() - start
+
+
+def bench_monitor_notify(size: int) -> float:
+    """Return the time to notify a Monitor of <size> activities.
+
+    """
+    return _bench_notify(Monitor(), size)
+
+
+def bench_monitor_report(size: int) -> float:
+    """Return the time for a Monitor to report on <size> activities.
+
+    """
+    monitor = Monitor()
+    _bench_notify(monitor, size)
+    start = perf_counter()
+    monitor.report()
+    return perf_counter() - start
+
+
+def _bench_notify(monitor: Monitor, size: int) -> float:
+    """Return the time to notify <monitor> of <size> activities, one
+    request, pickup and drop-off at a time for riders and drivers.
+
+    """
+    drivers, riders = _actors(size)
+    activities = []
+    for number, rider in enumerate(riders):
+        driver = drivers[number % len(drivers)]
+        activities.extend([(RIDER, REQUEST, rider.id, rider.origin),
+                           (DRIVER, REQUEST, driver.id, driver.location),
+                           (RIDER, PICKUP, rider.id, rider.origin),
+                           (DRIVER, PICKUP, driver.id, rider.origin),
+                           (DRIVER, DROPOFF, driver.id, rider.destination)])
+    activities = activities[:size]
+    start = perf_counter()
+    for timestamp, (category, description, identifier, location) \
+            in enumerate(activities):
+        monitor.notify(timestamp, category, description, identifier,
+                       location)
+    return perf_counter() - start
+
+
+def bench_create_event_list(size: int) -> float:
+    """Return the time to parse a text trace of <size> events.
+
+    """
+    handle, filename = tempfile.mkstemp(suffix='.txt')
+    os.close(handle)
+    try:
+        workload(size).write(filename)
+        start = perf_counter()
+        create_event_list(filename)
+        return perf_counter() - start
+    finally:
+        os.remove(filename)
+
+
+def bench_simulation(size: int) -> float:
+    """Return the time to simulate a workload of <size> events, loaded as a
+    list.
+
+    """
+    events = list(workload(size).events())
+    start = perf_counter()
+    Simulation().run(events)
+    return perf_counter() - start
+
+
+def bench_streaming_simulation(size: int) -> float:
+    """Return the time to simulate a workload of <size> events, streamed
+    into a StreamingMonitor.
+
+    """
+    events = workload(size).events()
+    start = perf_counter()
+    Simulation(monitor=StreamingMonitor()).run(events, streaming=True)
+    return perf_counter() - start
+
+
+def bench_batch_simulation(size: int) -> float:
+    """Return the time to simulate a workload of <size> events, loaded as a
+    list, with riders and drivers assigned in batches every unit of time.
+
+    """
+    events = list(workload(size).events())
+    start = perf_counter()
+    Simulation(dispatcher=BatchDispatcher()).run(events)
+    return perf_counter() - start
+
+
+def compare_dispatch(size: int, intervals: Sequence[int] = (1, 5)) \
+        -> Dict[str, Dict[str, float]]:
+    """Return the throughput and mean rider wait time of simulating a
+    workload of <size> events with the per-event dispatcher, keyed by
+    'per_event', and with a batch dispatcher at each of <intervals>, keyed
+    by 'batch_<interval>'.
+
+    Each result holds the time in seconds, the events done per second and
+    the mean rider wait time.
+    """
+    dispatchers = {'per_event': Dispatcher}
+    for interval in intervals:
+        dispatchers['batch_{}'.format(interval)] = \
+            lambda interval=interval: BatchDispatcher(interval)
+
+    results = {}
+    for name, dispatcher in dispatchers.items():
+        events = list(workload(size).events())
+        start = perf_counter()
+        report = Simulation(dispatcher=dispatcher()).run(events)
+        seconds = perf_counter() - start
+        results[name] = {'seconds': seconds,
+                         'events_per_second': size / seconds,
+                         'rider_wait_time': report['rider_wait_time']}
+    return results
+
+
+def _actors(size: int) -> tuple:
+    """Return the drivers and the riders of a workload of <size> events.
+
+    """
+    drivers, riders = [], []
+    for event in workload(size).events():
+        if hasattr(event, 'driver'):
+            drivers.append(event.driver)
+        else:
+            riders.append(event.rider)
+    return drivers, riders
+
+
+def _registered_dispatcher(size: int) -> tuple:
+    """Return a Dispatcher with every driver of a workload of <size> events
+    registered, and the riders of the workload.
+
+    """
+    dispatcher = Dispatcher()
+    drivers, riders = _actors(size)
+    dispatcher.register_drivers(drivers)
+    return dispatcher, riders
+
+
+BENCHMARKS: Dict[str, Callable[[int], float]] = {
+    'priority_queue.add_remove': bench_priority_queue,
+    'calendar_queue.add_remove': bench_calendar_queue,
+    'dispatcher.request_driver': bench_request_driver,
+    'dispatcher.request_rider': bench_request_rider,
+    'dispatcher.cancel_ride': bench_cancel_ride,
+    'monitor.notify': bench_monitor_notify,
+    'monitor.report': bench_monitor_report,
+    'event.create_event_list': bench_create_event_list,
+    'simulation.run': bench_simulation,
+    'simulation.run_streaming': bench_streaming_simulation,
+    'simulation.run_batch': bench_batch_simulation,
+}
+
+
+def run_benchmarks(sizes: Sequence[int], names: Optional[List[str]] = None,
+                   repeat: int = 3) -> Results:
+    """Return the best time out of <repeat> runs of each benchmark in
+    <names> at each of <sizes>, keyed by benchmark name and then size.
+
+    Each result holds the time in seconds and the time per event in
+    microseconds. All benchmarks are run if <names> is None.
+    """
+    results = {}
+    for name in BENCHMARKS if names is None else names:
+        results[name] = {}
+        for size in sizes:
+            seconds = min(BENCHMARKS[name](size) for _ in range(repeat))
+            results[name][str(size)] = {'seconds': seconds,
+                                        'us_per_event': seconds / size * 1e6}
+    return results
+
+
+def compare(results: Results, baseline: Results,
+            tolerance: float = 0.25) -> List[str]:
+    """Return a description of every result that is more than <tolerance>
+    (a fraction) slower than the same benchmark and size in <baseline>.
+
+    Results missing from the baseline are not compared.
+
+    >>> base = {'a': {'10': {'seconds': 1.0, 'us_per_event': 1e5}}}
+    >>> compare({'a': {'10': {'seconds': 1.2, 'us_per_event': 1.2e5}}}, base)
+    []
+    >>> compare({'a': {'10': {'seconds': 1.5, 'us_per_event': 1.5e5}}}, base)
+    ['a at size 10: 1.5000s vs 1.0000s baseline (+50%)']
+    """
+    regressions = []
+    for name, by_size in results.items():
+        for size, result in by_size.items():
+            previous = baseline.get(name, {}).get(size)
+            if previous is None:
+                continue
+            ratio = result['seconds'] / previous['seconds']
+            if ratio > 1 + tolerance:
+                regressions.append(
+                    '{} at size {}: {:.4f}s vs {:.4f}s baseline ({:+.0%})'
+                    .format(name, size, result['seconds'],
+                            previous['seconds'], ratio - 1))
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmarks as configured by the command line <argv>, and
+    return the exit status: 1 if a regression was found, and 0 otherwise.
+
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000],
+                        help='the numbers of events to benchmark with, '
+                             'for example 1000 100000 1000000')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS),
+                        help='the benchmarks to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='the number of runs to take the best of')
+    parser.add_argument('--output', help='a JSON file to write results to')
+    parser.add_argument('--baseline', help='a JSON file of results to '
+                                           'compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='the slowdown, as a fraction, that counts '
+                             'as a regression')
+    parser.add_argument('--dispatch', type=int, nargs='*',
+                        help='also compare the per-event dispatcher with '
+                             'batch dispatchers at these intervals '
+                             '(default: 1 5)')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.only, args.repeat)
+    document = {'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': results}
+    if args.dispatch is not None:
+        intervals = args.dispatch or [1, 5]
+        document['dispatch'] = {str(size): compare_dispatch(size, intervals)
+                                for size in args.sizes}
+    print(json.dumps(document, indent=2))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(document, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file)['results'],
+                                  args.tolerance)
+        for regression in regressions:
+            print('REGRESSION:', regression, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,330 @@
+"""
+The binary_trace module reads and writes event traces in a compact,
+fixed-width binary format, as an alternative to the text format read by
+event.create_event_list.
+
+A trace file has three parts:
+- A header: the magic bytes b'CSIM', the format version, the number of
+  records, and the byte offset of the id table.
+- The records, one per event, each RECORD.size bytes long. A record holds
+  the timestamp, the kind of event, the index of the actor's id in the id
+  table, two (row, column) pairs and one integer. For a DriverRequest these
+  are the driver's location, an unused (0, 0) pair and the speed; for a
+  RiderRequest they are the origin, the destination and the patience.
+- The id table: the number of ids, then each id as a length-prefixed
+  UTF-8 string. Each distinct id is stored once.
+
+=== Constants ===
+DRIVER_REQUEST: The record kind of a DriverRequest event.
+RIDER_REQUEST: The record kind of a RiderRequest event.
+HEADER: The layout of the file header.
+RECORD: The layout of one event record.
+"""
+
+import io
+import mmap
+import struct
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Tuple, Union
+from driver import Driver
+from event import Event, DriverRequest, RiderRequest, iter_events
+from location import intern_location
+from rider import Rider
+
+DRIVER_REQUEST = 0
+RIDER_REQUEST = 1
+
+MAGIC = b'CSIM'
+VERSION = 1
+HEADER = struct.Struct('<4sHxxQQ')
+RECORD = struct.Struct('<IBIiiiiI')
+_LENGTH = struct.Struct('<H')
+_COUNT = struct.Struct('<I')
+
+Record = Tuple[int, int, int, int, int, int, int, int]
+
+
+class TraceWriter:
+    """A writer of binary traces to a seekable binary file.
+
+    Records are written as they are added; the id table is written and the
+    header completed when the writer is closed.
+    """
+
+    # === Private Attributes ===
+    _file: BinaryIO
+    #     The file the trace is written to.
+    _start: int
+    #     The position of the header in _file.
+    _ids: Dict[str, int]
+    #     The index in the id table of every id written so far.
+    _count: int
+    #     The number of records written so far.
+
+    def __init__(self, file: BinaryIO) -> None:
+        """Initialize a TraceWriter that writes to <file>, starting at its
+        current position.
+
+        """
+        self._file = file
+        self._start = file.tell()
+        self._ids = {}
+        self._count = 0
+        file.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+
+    def __enter__(self) -> 'TraceWriter':
+        """Return this TraceWriter, for use in a with statement.
+
+        """
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Close this TraceWriter at the end of a with statement.
+
+        """
+        self.close()
+
+    def intern(self, identifier: str) -> int:
+        """Return the index of <identifier> in the id table, adding it if
+        it is new.
+
+        """
+        index = self._ids.get(identifier)
+        if index is None:
+            index = self._ids[identifier] = len(self._ids)
+        return index
+
+    def write_record(self, record: Record) -> None:
+        """Write the raw <record> to the trace.
+
+        """
+        self._file.write(RECORD.pack(*record))
+        self._count += 1
+
+    def write_block(self, data: bytes, count: int) -> None:
+        """Write <count> raw records, packed back to back in <data>, to the
+        trace.
+
+        Precondition: len(data) == count * RECORD.size
+        """
+        self._file.write(data)
+        self._count += count
+
+    def write_event(self, event: Event) -> None:
+        """Write <event> to the trace.
+
+        Precondition: event is a DriverRequest or a RiderRequest.
+        """
+        if isinstance(event, DriverRequest):
+            driver = event.driver
+            self.write_record((event.timestamp, DRIVER_REQUEST,
+                               self.intern(driver.id), driver.location.row,
+                               driver.location.column, 0, 0, driver.speed))
+        else:
+            rider = event.rider
+            self.write_record((event.timestamp, RIDER_REQUEST,
+                               self.intern(rider.id), rider.origin.row,
+                               rider.origin.column, rider.destination.row,
+                               rider.destination.column, rider.patience))
+
+    def close(self) -> None:
+        """Write the id table and complete the header.
+
+        """
+        table_offset = self._file.tell() - self._start
+        self._file.write(_COUNT.pack(len(self._ids)))
+        for identifier in self._ids:
+            encoded = identifier.encode('utf-8')
+            self._file.write(_LENGTH.pack(len(encoded)))
+            self._file.write(encoded)
+
+        end = self._file.tell()
+        self._file.seek(self._start)
+        self._file.write(HEADER.pack(MAGIC, VERSION, self._count,
+                                     table_offset))
+        self._file.seek(end)
+
+
+class TraceReader:
+    """A reader of binary traces from a buffer such as a memory map.
+
+    Records are decoded on demand straight from the buffer, which is never
+    copied. The id table is decoded once, the first time it is needed.
+    """
+
+    # === Private Attributes ===
+    _buffer: Union[bytes, mmap.mmap]
+    #     The buffer holding the whole trace.
+    _records: memoryview
+    #     A view of the records in _buffer.
+    _count: int
+    #     The number of records in the trace.
+    _table_offset: int
+    #     The position of the id table in _buffer.
+    _ids: List[str]
+    #     The id table, or an empty list if it has not been decoded yet.
+
+    def __init__(self, buffer: Union[bytes, mmap.mmap]) -> None:
+        """Initialize a TraceReader over the trace in <buffer>.
+
+        """
+        magic, version, count, table_offset = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('not a version {} event trace'.format(VERSION))
+
+        self._buffer = buffer
+        self._count = count
+        self._table_offset = table_offset
+        self._records = memoryview(buffer)[HEADER.size:table_offset]
+        self._ids = []
+
+    def __enter__(self) -> 'TraceReader':
+        """Return this TraceReader, for use in a with statement.
+
+        """
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Close this TraceReader at the end of a with statement.
+
+        """
+        self.close()
+
+    def __len__(self) -> int:
+        """Return the number of records in the trace.
+
+        """
+        return self._count
+
+    def __iter__(self) -> Iterator[Event]:
+        """Yield the events of the trace, in order.
+
+        """
+        ids = self.ids()
+        for record in self.records():
+            yield decode_record(record, ids)
+
+    def ids(self) -> List[str]:
+        """Return the id table of the trace.
+
+        """
+        if not self._ids and self._count:
+            position = self._table_offset
+            (count,) = _COUNT.unpack_from(self._buffer, position)
+            position += _COUNT.size
+            for _ in range(count):
+                (length,) = _LENGTH.unpack_from(self._buffer, position)
+                position += _LENGTH.size
+                self._ids.append(
+                    bytes(self._buffer[position:position + length]).decode(
+                        'utf-8'))
+                position += length
+        return self._ids
+
+    def record(self, index: int) -> Record:
+        """Return the raw record at <index>.
+
+        Precondition: 0 <= index < len(self)
+        """
+        return RECORD.unpack_from(self._records, index * RECORD.size)
+
+    def records(self) -> Iterator[Record]:
+        """Yield the raw records of the trace, in order.
+
+        Each record is unpacked by its position, so no export of the buffer
+        outlives a step of the iteration, and the reader can be closed
+        while an iterator is still alive.
+        """
+        unpack_from = RECORD.unpack_from
+        for position in range(0, self._count * RECORD.size, RECORD.size):
+            yield unpack_from(self._records, position)
+
+    def event(self, index: int) -> Event:
+        """Return a new Event for the record at <index>.
+
+        Precondition: 0 <= index < len(self)
+        """
+        return decode_record(self.record(index), self.ids())
+
+    def close(self) -> None:
+        """Release the buffer, closing it if it is a memory map.
+
+        """
+        self._records.release()
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+
+def decode_record(record: Record, ids: List[str]) -> Event:
+    """Return a new Event for <record>, whose ids index into <ids>.
+
+    """
+    timestamp, kind, identifier, row, column, row2, column2, value = record
+    if kind == DRIVER_REQUEST:
+        return DriverRequest(timestamp, Driver(ids[identifier],
+                                               intern_location(row, column),
+                                               value))
+    return RiderRequest(timestamp, Rider(ids[identifier],
+                                         intern_location(row, column),
+                                         intern_location(row2, column2),
+                                         value))
+
+
+def encode_trace(events: Iterable[Event]) -> bytes:
+    """Return <events> encoded as a binary trace.
+
+    >>> trace = TraceReader(encode_trace(iter_events('events.txt')))
+    >>> len(trace), str(trace.event(0))
+    (12, '0 -- Amaranth: Request a rider')
+    """
+    buffer = io.BytesIO()
+    with TraceWriter(buffer) as writer:
+        for event in events:
+            writer.write_event(event)
+    return buffer.getvalue()
+
+
+def read_trace(filename: str) -> bytes:
+    """Return the trace in <filename> as a binary trace, converting it if
+    it is a text trace.
+
+    """
+    with open(filename, 'rb') as file:
+        if file.read(len(MAGIC)) == MAGIC:
+            file.seek(0)
+            return file.read()
+    return encode_trace(iter_events(filename))
+
+
+def open_trace(filename: str) -> TraceReader:
+    """Return a TraceReader over the binary trace in <filename>, memory
+    mapped rather than read into memory.
+
+    """
+    with open(filename, 'rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return TraceReader(buffer)
+
+
+def convert_text_trace(text_filename: str, binary_filename: str) -> int:
+    """Convert the text trace in <text_filename> to a binary trace in
+    <binary_filename>, one event at a time. Return the number of events.
+
+    Precondition: the file stored at <text_filename> is in the format read
+    by event.create_event_list.
+    """
+    count = 0
+    with open(binary_filename, 'wb') as file, TraceWriter(file) as writer:
+        for event in iter_events(text_filename):
+            writer.write_event(event)
+            count += 1
+    return count
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(
+        config={
+            'allowed-io': ['open_trace', 'read_trace', 'convert_text_trace'],
+            'extra-imports': ['io', 'mmap', 'struct', 'typing', 'driver',
+                              'event', 'location', 'rider']})
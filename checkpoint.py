@@ -0,0 +1,122 @@
+"""
+The checkpoint module writes snapshots of a simulation to disk while it
+runs, and reads them back, so that a long run that is stopped can be
+resumed from its latest snapshot.
+
+A checkpoint file holds a header, made of the magic bytes b'CSIMCKPT' and
+the format version, followed by the zlib-compressed pickle of the snapshot.
+The snapshot is pickled in the simulation's thread, so it is consistent,
+while it is compressed and written in a background thread. The file is
+written under a temporary name and then renamed, so a crash while writing
+leaves the previous checkpoint intact.
+
+=== Constants ===
+HEADER: The layout of the file header.
+"""
+
+import os
+import pickle
+import struct
+import zlib
+from threading import Thread
+from typing import Optional
+
+MAGIC = b'CSIMCKPT'
+VERSION = 1
+HEADER = struct.Struct('<8sH')
+
+
+class Checkpointer:
+    """A writer of periodic checkpoints to one file.
+
+    === Attributes ===
+    filename: The file the latest checkpoint is written to.
+    interval: The number of events done between two checkpoints.
+    level: The zlib compression level, from 0 (none) to 9 (smallest).
+    """
+
+    filename: str
+    interval: int
+    level: int
+
+    # === Private Attributes ===
+    _thread: Optional[Thread]
+    #     The thread writing the latest checkpoint, or None if none was
+    #     started.
+    _error: Optional[BaseException]
+    #     The error raised while writing the latest checkpoint, or None if
+    #     there was none.
+
+    def __init__(self, filename: str, interval: int = 100000,
+                 level: int = 6) -> None:
+        """Initialize a Checkpointer.
+
+        Precondition: interval >= 1 and 0 <= level <= 9
+        """
+        self.filename = filename
+        self.interval = interval
+        self.level = level
+        self._thread = None
+        self._error = None
+
+    def save(self, state: object) -> None:
+        """Start writing a checkpoint of <state>, once the previous one is
+        written.
+
+        <state> is pickled before this method returns, so it may change
+        while the checkpoint is being written.
+        """
+        data = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+        self.wait()
+        self._thread = Thread(target=self._write, args=(data,))
+        self._thread.start()
+
+    def _write(self, data: bytes) -> None:
+        """Compress <data> and write it to the checkpoint file, replacing
+        the previous checkpoint.
+
+        """
+        try:
+            temporary = self.filename + '.tmp'
+            with open(temporary, 'wb') as file:
+                file.write(HEADER.pack(MAGIC, VERSION))
+                file.write(zlib.compress(data, self.level))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary, self.filename)
+        except OSError as error:
+            self._error = error
+
+    def wait(self) -> None:
+        """Wait until the latest checkpoint is written, and raise the error
+        that stopped it from being written, if any.
+
+        """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+
+def load_checkpoint(filename: str) -> object:
+    """Return the snapshot stored in the checkpoint file <filename>.
+
+    """
+    with open(filename, 'rb') as file:
+        data = file.read()
+    magic, version = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('not a version {} checkpoint'.format(VERSION))
+    return pickle.loads(zlib.decompress(data[HEADER.size:]))
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(
+        config={
+            'allowed-io': ['_write', 'load_checkpoint'],
+            'extra-imports': ['os', 'pickle', 'struct', 'zlib', 'threading',
+                              'typing']})
@@ -1,5 +1,11 @@
 """Containers of objects"""
 
+from collections import deque
+from heapq import heappush, heappop, heapify
+from itertools import count
+from operator import attrgetter
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
 
 class Container:
     """A container that holds objects.
@@ -13,12 +19,25 @@ class Container:
         """
         raise NotImplementedError("Implemented in a subclass")
 
+    def extend(self, items: Iterable) -> None:
+        """Add every item in <items> to this Container, in order.
+
+        """
+        for item in items:
+            self.add(item)
+
     def remove(self) -> object:
         """Remove and return a single item from this Container.
 
         """
         raise NotImplementedError("Implemented in a subclass")
 
+    def peek(self) -> object:
+        """Return the item that remove would return, without removing it.
+
+        """
+        raise NotImplementedError("Implemented in a subclass")
+
     def is_empty(self) -> bool:
         """Return True iff this Container is empty.
 
@@ -44,17 +63,54 @@ class PriorityQueue(Container):
 
     # === Private Attributes ===
     _items: list
-    #     The items stored in the priority queue.
+    #     The items stored in the priority queue, each wrapped in a
+    #     [item, sequence number] entry.
+    _counter: count
+    #     The source of sequence numbers, in insertion order.
     #
     # === Representation Invariants ===
-    # _items is a sorted list, where the first item in the queue is the
-    # item with the highest priority.
+    # _items is a binary min-heap of entries, where the first entry holds
+    # the item with the highest priority. Entries with equal items are
+    # ordered by their sequence number, which breaks ties in FIFO order.
 
     def __init__(self) -> None:
         """Initialize an empty PriorityQueue.
 
         """
         self._items = []
+        self._counter = count()
+
+    def __getstate__(self) -> dict:
+        """Return the state of this PriorityQueue for pickling.
+
+        """
+        return {'_items': self._items}
+
+    def __setstate__(self, state: dict) -> None:
+        """Restore this PriorityQueue from the pickled <state>, numbering
+        new items after every item in it.
+
+        >>> import pickle
+        >>> pq = PriorityQueue()
+        >>> pq.extend(["red", "blue"])
+        >>> copy = pickle.loads(pickle.dumps(pq))
+        >>> copy.add("blue")
+        >>> [copy.remove() for _ in range(3)]
+        ['blue', 'blue', 'red']
+        """
+        self._items = state['_items']
+        self._counter = count(max((entry[1] for entry in self._items),
+                                  default=-1) + 1)
+
+    def __len__(self) -> int:
+        """Return the number of items in this PriorityQueue.
+
+        >>> pq = PriorityQueue()
+        >>> pq.extend(["red", "blue"])
+        >>> len(pq)
+        2
+        """
+        return len(self._items)
 
     def remove(self) -> object:
         """Remove and return the next item from this PriorityQueue.
@@ -75,7 +131,22 @@ class PriorityQueue(Container):
         >>> pq.remove()
         'yellow'
         """
-        return self._items.pop(0)
+        return heappop(self._items)[0]
+
+    def peek(self) -> object:
+        """Return the next item from this PriorityQueue without removing it.
+
+        Precondition: <self> should not be empty.
+
+        >>> pq = PriorityQueue()
+        >>> pq.add("red")
+        >>> pq.add("blue")
+        >>> pq.peek()
+        'blue'
+        >>> len(pq)
+        2
+        """
+        return self._items[0][0]
 
     def is_empty(self) -> bool:
         """
@@ -98,13 +169,299 @@ class PriorityQueue(Container):
         >>> pq.add("blue")
         >>> pq.add("red")
         >>> pq.add("green")
-        >>> pq._items
-        ['blue', 'green', 'red', 'yellow']
+        >>> pq.peek()
+        'blue'
+        """
+        heappush(self._items, [item, next(self._counter)])
+
+    def extend(self, items: Iterable) -> None:
+        """Add every item in <items> to this PriorityQueue, in order.
+
+        The items are appended and the heap is rebuilt once, which takes
+        linear time rather than one heap insertion per item.
+
+        >>> pq = PriorityQueue()
+        >>> pq.add("red")
+        >>> pq.extend(["yellow", "blue", "red"])
+        >>> [pq.remove() for _ in range(4)]
+        ['blue', 'red', 'red', 'yellow']
+        """
+        self._items.extend([item, next(self._counter)] for item in items)
+        heapify(self._items)
+
+
+class CalendarQueue(Container):
+    """A queue of items that operates in order of an integer time key.
+
+    Items are kept in one bucket per tick, so adding an item to a tick that
+    already has pending items and removing the next item both take constant
+    time. Only the first item scheduled for a new tick pays for a heap
+    operation on the (usually short) list of pending ticks. Items with the
+    same key are removed in FIFO order, exactly as in a PriorityQueue.
+
+    By default the key of an item is its <timestamp> attribute, so the
+    queue can hold Events directly.
+
+    Precondition: every key is an integer.
+    """
+
+    # === Private Attributes ===
+    _key: Callable[[object], int]
+    #     The function that returns the tick of an item.
+    _buckets: Dict[int, deque]
+    #     The pending items, grouped by tick in insertion order.
+    _ticks: list
+    #     A binary min-heap of the ticks in _buckets.
+    _size: int
+    #     The number of items in this CalendarQueue.
+    #
+    # === Representation Invariants ===
+    # Every bucket in _buckets is non-empty, and _ticks holds exactly the
+    # keys of _buckets.
+    # _size is the total number of items over all buckets.
+
+    def __init__(self, key: Optional[Callable[[object], int]] = None) -> None:
+        """Initialize an empty CalendarQueue that orders items by <key>.
+
+        """
+        self._key = attrgetter('timestamp') if key is None else key
+        self._buckets = {}
+        self._ticks = []
+        self._size = 0
+
+    def __len__(self) -> int:
+        """Return the number of items in this CalendarQueue.
+
+        >>> cq = CalendarQueue(len)
+        >>> cq.extend(["red", "blue", "green"])
+        >>> len(cq)
+        3
+        """
+        return self._size
+
+    def add(self, item: object) -> None:
+        """Add <item> to this CalendarQueue.
+
+        >>> cq = CalendarQueue(len)
+        >>> cq.add("yellow")
+        >>> cq.add("red")
+        >>> cq.add("blue")
+        >>> cq.peek()
+        'red'
+        """
+        tick = self._key(item)
+        bucket = self._buckets.get(tick)
+        if bucket is None:
+            self._buckets[tick] = deque((item,))
+            heappush(self._ticks, tick)
+        else:
+            bucket.append(item)
+        self._size += 1
+
+    def extend(self, items: Iterable) -> None:
+        """Add every item in <items> to this CalendarQueue, in order.
+
+        New ticks are collected and the tick heap is rebuilt once.
+
+        >>> cq = CalendarQueue(len)
+        >>> cq.add("red")
+        >>> cq.extend(["yellow", "blue", "green"])
+        >>> [cq.remove() for _ in range(4)]
+        ['red', 'blue', 'green', 'yellow']
+        """
+        key = self._key
+        buckets = self._buckets
+        new_ticks = False
+        for item in items:
+            tick = key(item)
+            bucket = buckets.get(tick)
+            if bucket is None:
+                buckets[tick] = deque((item,))
+                self._ticks.append(tick)
+                new_ticks = True
+            else:
+                bucket.append(item)
+            self._size += 1
+        if new_ticks:
+            heapify(self._ticks)
+
+    def remove(self) -> object:
+        """Remove and return the next item from this CalendarQueue.
+
+        Precondition: <self> should not be empty.
+
+        >>> cq = CalendarQueue(len)
+        >>> cq.add("red")
+        >>> cq.add("blue")
+        >>> cq.add("yellow")
+        >>> cq.remove()
+        'red'
+        >>> cq.remove()
+        'blue'
+        >>> cq.remove()
+        'yellow'
+        """
+        tick = self._ticks[0]
+        bucket = self._buckets[tick]
+        item = bucket.popleft()
+        if not bucket:
+            del self._buckets[tick]
+            heappop(self._ticks)
+        self._size -= 1
+        return item
+
+    def peek(self) -> object:
+        """Return the next item from this CalendarQueue without removing it.
+
+        Precondition: <self> should not be empty.
+        """
+        return self._buckets[self._ticks[0]][0]
+
+    def is_empty(self) -> bool:
+        """Return true iff this CalendarQueue is empty.
+
+        >>> cq = CalendarQueue()
+        >>> cq.is_empty()
+        True
+        """
+        return self._size == 0
+
+
+class WaitingList(Container):
+    """A first-come-first-served queue of items that can also be withdrawn
+    from anywhere in the queue.
+
+    Items are told apart by identity, not equality: adding an item that is
+    already waiting has no effect. Adding, removing and withdrawing an item
+    all take constant amortized time.
+    """
+
+    # === Private Attributes ===
+    _queue: deque
+    #     [sequence number, item] entries in insertion order, including
+    #     entries for items that have since been withdrawn.
+    _waiting: Dict[int, int]
+    #     The sequence number of the live entry of each waiting item, keyed
+    #     by the id() of the item.
+    _counter: count
+    #     The source of sequence numbers, in insertion order.
+    #
+    # === Representation Invariants ===
+    # An entry in _queue is live iff _waiting maps the id() of its item to
+    # its sequence number.
+    # _queue has at most twice as many entries as _waiting, plus a small
+    # constant.
+
+    def __init__(self) -> None:
+        """Initialize an empty WaitingList.
+
+        """
+        self._queue = deque()
+        self._waiting = {}
+        self._counter = count()
+
+    def __getstate__(self) -> dict:
+        """Return the state of this WaitingList for pickling: the waiting
+        items, first come first, since their id() differs once unpickled.
+
         """
+        return {'items': list(self)}
 
-        self._items.append(item)
-        self._items.sort()
-        return None
+    def __setstate__(self, state: dict) -> None:
+        """Restore this WaitingList from the pickled <state>.
+
+        >>> import pickle
+        >>> wl = WaitingList()
+        >>> wl.extend(["red", "blue", "green"])
+        >>> wl.discard("blue")
+        >>> copy = pickle.loads(pickle.dumps(wl))
+        >>> copy.remove(), list(copy)
+        ('red', ['green'])
+        """
+        self.__init__()
+        self.extend(state['items'])
+
+    def __len__(self) -> int:
+        """Return the number of items waiting in this WaitingList.
+
+        """
+        return len(self._waiting)
+
+    def __contains__(self, item: object) -> bool:
+        """Return True iff <item> is waiting in this WaitingList.
+
+        """
+        return id(item) in self._waiting
+
+    def __iter__(self) -> Iterator:
+        """Return an iterator over the waiting items, first come first.
+
+        """
+        waiting = self._waiting
+        return (item for seq, item in self._queue
+                if waiting.get(id(item)) == seq)
+
+    def add(self, item: object) -> None:
+        """Add <item> to the end of this WaitingList, unless it is already
+        waiting.
+
+        >>> wl = WaitingList()
+        >>> wl.add("red")
+        >>> wl.add("blue")
+        >>> wl.add("red")
+        >>> list(wl)
+        ['red', 'blue']
+        """
+        if id(item) not in self._waiting:
+            seq = next(self._counter)
+            self._waiting[id(item)] = seq
+            self._queue.append((seq, item))
+
+    def remove(self) -> object:
+        """Remove and return the item that has been waiting the longest.
+
+        Precondition: <self> should not be empty.
+
+        >>> wl = WaitingList()
+        >>> wl.extend(["red", "blue", "green"])
+        >>> wl.remove()
+        'red'
+        >>> wl.remove()
+        'blue'
+        """
+        waiting = self._waiting
+        while True:
+            seq, item = self._queue.popleft()
+            if waiting.get(id(item)) == seq:
+                del waiting[id(item)]
+                return item
+
+    def discard(self, item: object) -> None:
+        """Withdraw <item> from this WaitingList, if it is waiting.
+
+        >>> wl = WaitingList()
+        >>> wl.extend(["red", "blue", "green"])
+        >>> wl.discard("blue")
+        >>> wl.discard("yellow")
+        >>> list(wl)
+        ['red', 'green']
+        """
+        if self._waiting.pop(id(item), None) is not None and \
+                len(self._queue) > 2 * len(self._waiting) + 16:
+            waiting = self._waiting
+            self._queue = deque(entry for entry in self._queue
+                                if waiting.get(id(entry[1])) == entry[0])
+
+    def is_empty(self) -> bool:
+        """Return true iff no item is waiting in this WaitingList.
+
+        >>> wl = WaitingList()
+        >>> wl.add("thing")
+        >>> wl.discard("thing")
+        >>> wl.is_empty()
+        True
+        """
+        return len(self._waiting) == 0
 
 
 if __name__ == '__main__':
@@ -1,8 +1,14 @@
 """Dispatcher for the simulation"""
 
-from typing import Optional
+from heapq import heappop, heappush
+from typing import Iterable, List, Optional, Tuple
+from assignment import min_cost_assignment
 from driver import Driver
 from rider import Rider
+from location import Location
+from spatial import DriverGrid
+from container import WaitingList
+from timer_wheel import TimerWheel
 
 
 class Dispatcher:
@@ -22,14 +28,29 @@ class Dispatcher:
 
     """
     driver_register: list
-    riders_waiting_list: list
+    riders_waiting_list: WaitingList
 
-    def __init__(self) -> None:
+    # === Private Attributes ===
+    _registered: set
+    #     Every driver in driver_register, for constant time registration
+    #     checks.
+    _idle_drivers: DriverGrid
+    #     The pool of registered drivers that are idle, indexed by location.
+    _deadlines: TimerWheel
+    #     The Cancellation event of every rider that has not been picked up
+    #     or cancelled yet, due when the rider's patience runs out.
+
+    def __init__(self, cell_size: int = 8) -> None:
         """Initialize a Dispatcher.
 
+        cell_size: The number of rows and columns covered by one cell of the
+            spatial index used to find the fastest driver.
         """
         self.driver_register = []
-        self.riders_waiting_list = []
+        self.riders_waiting_list = WaitingList()
+        self._registered = set()
+        self._idle_drivers = DriverGrid(cell_size)
+        self._deadlines = TimerWheel()
 
     def __str__(self) -> str:
         """Return a string representation of the driver_register and the
@@ -46,27 +67,78 @@ class Dispatcher:
         return 'Rider Waiting list: ' + rider_string + '\n' + \
             'Driver Waiting List: ' + driver_string + '\n'
 
+    def idle_count(self) -> int:
+        """Return the number of registered drivers that are idle.
+
+        >>> dispatcher = Dispatcher()
+        >>> dispatcher.register_drivers([Driver('Ana', Location(1, 1), 1)])
+        >>> dispatcher.idle_count()
+        1
+        """
+        return len(self._idle_drivers)
+
+    def waiting_count(self) -> int:
+        """Return the number of riders on the waiting list.
+
+        """
+        return len(self.riders_waiting_list)
+
+    def register_drivers(self, drivers: Iterable[Driver]) -> None:
+        """Register every driver in <drivers> that is not yet registered,
+        in order, for future rider requests.
+
+        This has the same effect as a request_rider call for each driver
+        while no rider is waiting, without doing the per-request work.
+
+        >>> dispatcher = Dispatcher()
+        >>> d = Driver('Ana', Location(1, 1), 1)
+        >>> dispatcher.register_drivers([d, d])
+        >>> dispatcher.request_rider(d) is None
+        True
+        >>> len(dispatcher.driver_register)
+        1
+        """
+        for driver in drivers:
+            self._register(driver)
+
+    def _register(self, driver: Driver) -> None:
+        """Register <driver>, if it is not registered yet.
+
+        """
+        if driver not in self._registered:
+            self._registered.add(driver)
+            self.driver_register.append(driver)
+            self.update_driver(driver)
+
+    def update_driver(self, driver: Driver) -> None:
+        """Record that <driver> has started or finished a drive or a ride,
+        and may have moved to a new location.
+
+        The driver joins the idle pool if it is idle, and leaves it
+        otherwise. Unregistered drivers are ignored.
+        """
+        if driver in self._registered:
+            if driver.is_idle:
+                self._idle_drivers.add(driver)
+            else:
+                self._idle_drivers.remove(driver)
+
     def request_driver(self, rider: Rider) -> Optional[Driver]:
         """Return a driver for the rider, or None if no driver is available.
 
+        The driver is the idle driver that can reach the rider's origin the
+        fastest; ties go to the driver that registered first.
+
         Add the rider to the waiting list if there is no available driver.
         """
-        if len(self.driver_register) == 0:
-            self.riders_waiting_list.append(rider)
+        fastest = self._idle_drivers.fastest(rider.origin)
+        if fastest is None:
+            self.riders_waiting_list.add(rider)
             return None
 
-        elif len(self.driver_register) == 1:
-            fastest = self.driver_register[0]
-            fastest.is_idle = False
-            return fastest
-        else:
-            fastest = self.driver_register[0]
-            for available_driver in self.driver_register[1:]:
-                if available_driver.start_drive(rider.origin) <= \
-                        fastest.start_drive(rider.origin):
-                    fastest = available_driver
-                    fastest.is_idle = False
-            return fastest
+        fastest.is_idle = False
+        self._idle_drivers.remove(fastest)
+        return fastest
 
     def request_rider(self, driver: Driver) -> Optional[Rider]:
         """Return a rider for the driver, or None if no rider is available.
@@ -74,25 +146,239 @@ class Dispatcher:
         If this is a new driver, register the driver for future rider requests.
         """
 
-        if driver not in self.driver_register:
-            self.driver_register.append(driver)
-        if len(self.riders_waiting_list) == 0:
+        self._register(driver)
+        if self.riders_waiting_list.is_empty():
+            self.update_driver(driver)
             return None
         else:
-            rider_assigned = self.riders_waiting_list.pop(0)
+            rider_assigned = self.riders_waiting_list.remove()
             driver.destination = rider_assigned.origin
             driver.is_idle = False
+            self._idle_drivers.remove(driver)
 
         return rider_assigned
 
     def cancel_ride(self, rider: Rider) -> None:
         """Cancel the ride for rider.
         """
-        if rider in self.riders_waiting_list:
-            self.riders_waiting_list.remove(rider)
+        self.riders_waiting_list.discard(rider)
+        self._deadlines.discard(rider)
+
+    def dispatch_time(self, timestamp: int) -> Optional[int]:
+        """Return the time of a batch dispatch to schedule after a request
+        at <timestamp>, or None if none is needed.
+
+        This dispatcher assigns riders and drivers as they make requests,
+        so it never needs one.
+        """
+        return None
+
+    def dispatch(self) -> List[Tuple[Rider, Driver]]:
+        """Assign waiting riders to idle drivers in one batch, and return
+        each rider with their driver.
+
+        This dispatcher assigns riders and drivers as they make requests,
+        so no batch is ever left to assign.
+        """
+        return []
+
+    def set_deadline(self, cancellation: object) -> None:
+        """Hold the Cancellation event <cancellation> until it is due,
+        unless its rider is picked up first.
+
+        Deadlines are kept apart from the event queue, so that the queue
+        only holds events that do something.
+        """
+        self._deadlines.add(cancellation.rider, cancellation)
+
+    def clear_deadline(self, rider: Rider) -> None:
+        """Drop the deadline of <rider>, who no longer needs one.
+
+        """
+        self._deadlines.discard(rider)
+
+    def expired(self, timestamp: int, sequence: int) -> List[object]:
+        """Remove and return the Cancellation events that are due before
+        the event with <timestamp> and <sequence>, in order.
+
+        An event at <timestamp> from the input of a streaming run has
+        <sequence> -1: deadlines at its timestamp are done after it.
+        """
+        return self._deadlines.expire(timestamp, sequence)
+
+    def pop_deadlines(self) -> List[object]:
+        """Remove and return every remaining Cancellation event, in order.
+
+        """
+        return self._deadlines.pop_all()
+
+
+class BatchDispatcher(Dispatcher):
+    """A dispatcher that assigns riders and drivers in batches, at fixed
+    dispatch intervals, instead of at each request.
+
+    A rider who requests a driver always joins the waiting list, and a
+    driver who requests a rider always joins the idle pool. Once both have
+    someone, a dispatch is scheduled for the end of the current interval,
+    when every waiting rider that can be is assigned to an idle driver in
+    one pass. Riders may cancel until then.
+
+    Small batches, with at most <optimal_limit> rider and driver pairs, are
+    assigned so that the total travel time of the drivers to their riders
+    is the lowest possible. Larger ones are assigned greedily: the pair
+    with the shortest travel time first, found through the spatial index
+    of idle drivers, with ties going to the rider who has waited longest.
+
+    === Attributes ===
+    interval: The time between two dispatches.
+    optimal_limit: The largest number of rider and driver pairs in a batch
+        that is assigned optimally.
+    """
+
+    interval: int
+    optimal_limit: int
+
+    # === Private Attributes ===
+    _scheduled: bool
+    #     Whether a dispatch has been scheduled and not done yet.
+
+    def __init__(self, interval: int = 1, optimal_limit: int = 400,
+                 cell_size: int = 8) -> None:
+        """Initialize a BatchDispatcher that dispatches every <interval>
+        units of time.
+
+        Precondition: interval >= 1
+        """
+        Dispatcher.__init__(self, cell_size)
+        self.interval = interval
+        self.optimal_limit = optimal_limit
+        self._scheduled = False
+
+    def request_driver(self, rider: Rider) -> Optional[Driver]:
+        """Add the rider to the waiting list, and return None: riders are
+        assigned a driver at the next dispatch.
+
+        """
+        self.riders_waiting_list.add(rider)
+        return None
+
+    def request_rider(self, driver: Driver) -> Optional[Rider]:
+        """Register the driver, if this is a new driver, add it to the idle
+        pool, and return None: drivers are assigned a rider at the next
+        dispatch.
+
+        """
+        self._register(driver)
+        self.update_driver(driver)
+        return None
+
+    def dispatch_time(self, timestamp: int) -> Optional[int]:
+        """Return the end of the interval that contains <timestamp>, if a
+        rider is waiting and a driver is idle but no dispatch is scheduled
+        yet, and None otherwise.
+
+        The dispatch is then counted as scheduled.
+
+        >>> dispatcher = BatchDispatcher(5)
+        >>> dispatcher.request_driver(
+        ...     Rider('Ann', Location(0, 0), Location(1, 1), 3))
+        >>> print(dispatcher.dispatch_time(7))
+        None
+        >>> dispatcher.request_rider(Driver('Bo', Location(2, 2), 1))
+        >>> dispatcher.dispatch_time(7), dispatcher.dispatch_time(8)
+        (10, None)
+        """
+        if self._scheduled or self.riders_waiting_list.is_empty() or \
+                not len(self._idle_drivers):
+            return None
+        self._scheduled = True
+        return (timestamp // self.interval + 1) * self.interval
+
+    def dispatch(self) -> List[Tuple[Rider, Driver]]:
+        """Assign waiting riders to idle drivers in one batch, until no
+        rider is waiting or no driver is idle, and return each rider with
+        their driver, in the order the riders joined the waiting list.
+
+        Each driver is taken out of the idle pool, and each rider off the
+        waiting list.
+
+        >>> dispatcher = BatchDispatcher()
+        >>> near = Driver('Near', Location(1, 1), 1)
+        >>> far = Driver('Far', Location(9, 9), 1)
+        >>> dispatcher.register_drivers([near, far])
+        >>> for name, row in [('Ann', 8), ('Bea', 2), ('Cal', 5)]:
+        ...     _ = dispatcher.request_driver(
+        ...         Rider(name, Location(row, row), Location(0, 0), 9))
+        >>> [(rider.id, driver.id) for rider, driver in dispatcher.dispatch()]
+        [('Ann', 'Far'), ('Bea', 'Near')]
+        >>> dispatcher.waiting_count(), dispatcher.idle_count()
+        (1, 0)
+        """
+        self._scheduled = False
+        riders = list(self.riders_waiting_list)
+        if not riders or not len(self._idle_drivers):
+            return []
+
+        if len(riders) * len(self._idle_drivers) <= self.optimal_limit:
+            pairs = self._assign_optimally(riders)
+        else:
+            pairs = self._assign_greedily(riders)
+        for rider, driver in pairs:
+            self.riders_waiting_list.discard(rider)
+            driver.is_idle = False
+            self._idle_drivers.remove(driver)
+        return pairs
+
+    def _assign_optimally(self, riders: List[Rider]) \
+            -> List[Tuple[Rider, Driver]]:
+        """Return the assignment of <riders> to idle drivers with the lowest
+        total travel time to the riders.
+
+        """
+        drivers = list(self._idle_drivers)
+        costs = [[driver.get_travel_time(rider.origin) for driver in drivers]
+                 for rider in riders]
+        return [(rider, drivers[column]) for rider, column
+                in zip(riders, min_cost_assignment(costs))
+                if column is not None]
+
+    def _assign_greedily(self, riders: List[Rider]) \
+            -> List[Tuple[Rider, Driver]]:
+        """Return the assignment of <riders> to idle drivers that repeatedly
+        pairs the rider and driver with the shortest travel time.
+
+        Each rider's fastest driver is only searched for again once that
+        driver has gone to another rider, since it can only get slower.
+        Assigned drivers are taken out of the idle pool as they are found.
+        """
+        idle = self._idle_drivers
+        heap = []
+        for order, rider in enumerate(riders):
+            driver = idle.fastest(rider.origin)
+            heappush(heap, (driver.get_travel_time(rider.origin), order,
+                            driver))
+
+        assigned = [None] * len(riders)
+        while heap and len(idle):
+            _, order, driver = heappop(heap)
+            rider = riders[order]
+            if driver in idle:
+                assigned[order] = driver
+                idle.remove(driver)
+            else:
+                driver = idle.fastest(rider.origin)
+                heappush(heap, (driver.get_travel_time(rider.origin), order,
+                                driver))
+        return [(rider, driver) for rider, driver in zip(riders, assigned)
+                if driver is not None]
 
 
 if __name__ == '__main__':
     import python_ta
 
-    python_ta.check_all(config={'extra-imports': ['typing', 'driver', 'rider']})
+    python_ta.check_all(config={'extra-imports': ['heapq', 'typing',
+                                                   'assignment', 'driver',
+                                                   'rider',
+                                                   'location', 'spatial',
+                                                   'container',
+                                                   'timer_wheel']})
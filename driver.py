@@ -1,8 +1,43 @@
-"""Drivers for the simulation"""
+"""Drivers for the simulation
 
-from location import Location, manhattan_distance
+=== Constants ===
+TRAVEL_TIME_CACHE_SIZE: The number of travel times kept by drive_time.
+"""
+
+from functools import lru_cache
+from location import Location
 from rider import Rider
 
+TRAVEL_TIME_CACHE_SIZE = 1 << 16
+
+
+def travel_time(origin_row: int, origin_column: int, destination_row: int,
+                destination_column: int, speed: int) -> int:
+    """Return the time it takes to drive from the origin to the destination
+    at <speed>, rounded to the nearest integer.
+
+    >>> travel_time(2, 4, 5, 7, 3)
+    2
+    """
+    return drive_time(abs(origin_row - destination_row) +
+                      abs(origin_column - destination_column), speed)
+
+
+@lru_cache(maxsize=TRAVEL_TIME_CACHE_SIZE)
+def drive_time(distance: int, speed: int) -> int:
+    """Return the time it takes to drive <distance> at <speed>, rounded to
+    the nearest integer.
+
+    The results are cached, keyed by the distance and the speed: there are
+    only as many distances as a grid is rows and columns across, so almost
+    every drive is a hit. drive_time.cache_info() reports the cache hits
+    and misses, and drive_time.cache_clear() empties the cache.
+
+    >>> drive_time(6, 3)
+    2
+    """
+    return int(round(distance / speed, 0))
+
 
 class Driver:
     """A driver for a ride-sharing service.
@@ -41,31 +76,37 @@ class Driver:
                f'{self.is_idle}, Speed: {self.speed}'
 
     def __eq__(self, other: object) -> bool:
-        """Return True if self equals other, and false otherwise.
+        """Return True iff other is a Driver with the same id as self.
+
+        A driver's id identifies them for the whole simulation, so drivers
+        are compared by id alone, wherever they are and whatever they do.
 
         >>> d = Driver('Johnny', Location(1, 1), 90)
         >>> s =  Driver('Johnny', Location(1, 1), 90)
         >>> d == s
         True
+        >>> s.start_drive(Location(5, 5))
+        0
+        >>> d == s
+        True
+        """
+        return isinstance(other, Driver) and self.id == other.id
+
+    def __hash__(self) -> int:
+        """Return a hash of this driver's id, so that drivers can be kept in
+        sets and used as dictionary keys.
+
         """
-        if isinstance(other, Driver):
-            if self.id == other.id and \
-                    self.speed == other.speed and \
-                    self.location == other.location and \
-                    self.is_idle == other.is_idle and \
-                    self.destination == other.destination:
-                return True
-            else:
-                return False
-        return False
+        return hash(self.id)
 
     def get_travel_time(self, destination: Location) -> int:
         """Return the time it will take to arrive at the destination,
         rounded to the nearest integer.
 
        """
-        return int((round(manhattan_distance(self.location, destination)
-                          / self.speed, 0)))
+        location = self.location
+        return travel_time(location.row, location.column, destination.row,
+                           destination.column, self.speed)
 
     def start_drive(self, location: Location) -> int:
         """Start driving to the location.
@@ -113,4 +154,4 @@ if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(
-        config={'extra-imports': ['location', 'rider']})
+        config={'extra-imports': ['functools', 'location', 'rider']})
@@ -4,7 +4,8 @@ This file should contain all of the classes necessary to model the different
 kinds of events in the simulation.
 """
 from __future__ import annotations
-from typing import List
+from itertools import count
+from typing import Iterator, List
 from rider import Rider, WAITING, CANCELLED, SATISFIED
 from dispatcher import Dispatcher
 from driver import Driver
@@ -12,6 +13,27 @@ from location import deserialize_location
 from monitor import Monitor, RIDER, DRIVER, REQUEST, CANCEL, PICKUP, DROPOFF
 from location import Location
 
+# The source of event sequence numbers, in creation order.
+_sequence = count()
+
+
+def next_sequence() -> int:
+    """Return a sequence number higher than that of any event created so
+    far.
+
+    """
+    return next(_sequence)
+
+
+def advance_sequence(start: int) -> None:
+    """Number the events created from now on from <start> or higher, for
+    example to continue a simulation whose events were created in another
+    process.
+
+    """
+    global _sequence
+    _sequence = count(max(start, next(_sequence)))
+
 
 class Event:
     """An event.
@@ -30,9 +52,14 @@ class Event:
 
     === Attributes ===
     timestamp: A timestamp for this event.
+    sequence: The order in which this event was created among all events.
+        Events that are created in order are queued in that order, so of
+        two events with the same timestamp, the one with the lower sequence
+        is done first.
     """
 
     timestamp: int
+    sequence: int
 
     def __init__(self, timestamp: int) -> None:
         """Initialize an Event with a given timestamp.
@@ -41,8 +68,11 @@ class Event:
 
         >>> Event(7).timestamp
         7
+        >>> Event(7).sequence < Event(7).sequence
+        True
         """
         self.timestamp = timestamp
+        self.sequence = next(_sequence)
 
     # The following six 'magic methods' are overridden to allow for easy
     # comparison of Event instances. All comparisons simply perform the
@@ -173,8 +203,11 @@ class RiderRequest(Event):
         If the rider is assigned to a driver, the driver starts driving to
         the rider.
 
-        Return a Cancellation event. If the rider is assigned to a driver,
-        also return a Pickup event.
+        Set the rider's patience deadline with the dispatcher, as a
+        Cancellation event that is done when the rider's patience runs out,
+        unless the rider has been picked up by then. If the rider is
+        assigned to a driver, return a Pickup event, and if the dispatcher
+        assigns riders in batches, the Dispatch event it needs, if any.
 
         """
         monitor.notify(self.timestamp, RIDER, REQUEST,
@@ -186,8 +219,14 @@ class RiderRequest(Event):
             travel_time = driver.start_drive(self.rider.origin)
             events.append(Pickup(self.timestamp + travel_time,
                                  self.rider, driver))
-        events.append(Cancellation(self.timestamp + self.rider.patience,
-                                   self.rider))
+        else:
+            dispatch_time = dispatcher.dispatch_time(self.timestamp)
+            if dispatch_time is not None:
+                events.append(Dispatch(dispatch_time))
+        # The deadline is created after the Pickup, so it is done after a
+        # Pickup with the same timestamp.
+        dispatcher.set_deadline(Cancellation(
+            self.timestamp + self.rider.patience, self.rider))
         return events
 
     def __str__(self) -> str:
@@ -217,7 +256,9 @@ class DriverRequest(Event):
         """Register the driver, if this is the first request, and
         assign a rider to the driver, if one is available.
 
-        If a rider is available, return a Pickup event.
+        If a rider is available, return a Pickup event. If the dispatcher
+        assigns riders in batches, return the Dispatch event it needs, if
+        any, instead.
         """
         # Notify the monitor about the request.
 
@@ -234,6 +275,10 @@ class DriverRequest(Event):
             travel_time = self.driver.start_drive(rider.origin)
             events.append(Pickup(self.timestamp + travel_time, rider,
                                  self.driver))
+        else:
+            dispatch_time = dispatcher.dispatch_time(self.timestamp)
+            if dispatch_time is not None:
+                events.append(Dispatch(dispatch_time))
         return events
 
     def __str__(self) -> str:
@@ -244,6 +289,43 @@ class DriverRequest(Event):
         return f"{self.timestamp} -- {self.driver.id}: Request a rider"
 
 
+class Dispatch(Event):
+    """The dispatcher assigns waiting riders to idle drivers in one batch.
+
+    >>> from dispatcher import BatchDispatcher
+    >>> dispatcher = BatchDispatcher(5)
+    >>> monitor = Monitor()
+    >>> rider = Rider('Ann', Location(3, 3), Location(0, 0), 9)
+    >>> driver = Driver('Bo', Location(1, 1), 2)
+    >>> RiderRequest(2, rider).do(dispatcher, monitor)
+    []
+    >>> [str(event) for event in DriverRequest(3, driver).do(dispatcher,
+    ...                                                      monitor)]
+    ['5 -- Dispatch']
+    >>> [str(event) for event in Dispatch(5).do(dispatcher, monitor)]
+    ['7 -- Bo: Pickup Ann']
+    """
+
+    def do(self, dispatcher: Dispatcher, monitor: Monitor) -> List[Event]:
+        """Assign waiting riders to idle drivers, and start each driver
+        driving to their rider.
+
+        Return a Pickup event for each driver.
+        """
+        events = []
+        for rider, driver in dispatcher.dispatch():
+            travel_time = driver.start_drive(rider.origin)
+            events.append(Pickup(self.timestamp + travel_time, rider,
+                                 driver))
+        return events
+
+    def __str__(self) -> str:
+        """Return a string representation of this event.
+
+        """
+        return f"{self.timestamp} -- Dispatch"
+
+
 class Cancellation(Event):
     """ A cancellation event
         >>> name1 = 'Jane Doe'
@@ -256,13 +338,15 @@ class Cancellation(Event):
         >>> id1 = 'John Doe'
         >>> driver1 = Driver(id1, location1, speed1)
         >>> dispatcher = Dispatcher()
-        >>> dispatcher.driver_register.append(driver1)
+        >>> monitor = Monitor()
         >>> timestamp1 = 4
-        >>> event1 = DriverRequest(timestamp1, driver1)
+        >>> event1 = RiderRequest(timestamp1, rider1)
         >>> timestamp2 = event1.timestamp + rider1.patience
         >>> event2 = Cancellation(timestamp2,rider1)
+        >>> event2.do(dispatcher, monitor)
+        []
         >>> rider1.status
-        cancelled
+        'cancelled'
     """
 
     driver: Driver
@@ -284,7 +368,7 @@ class Cancellation(Event):
         """
         events = []
         if self.rider.status == WAITING:
-            self.rider.status == CANCELLED
+            self.rider.status = CANCELLED
             dispatcher.cancel_ride(self.rider)
             monitor.notify(self.timestamp, RIDER, CANCEL, self.rider.
                            id, self.rider.origin)
@@ -309,7 +393,7 @@ class Pickup(Event):
     driver: Driver
     rider: Rider
 
-    def __init__(self, timestamp: int, driver: Driver, rider: Rider) -> None:
+    def __init__(self, timestamp: int, rider: Rider, driver: Driver) -> None:
         """Initialize a Pickup event.
 
         """
@@ -336,13 +420,18 @@ class Pickup(Event):
         >>> id1 = 'John Doe'
         >>> driver1 = Driver(id1, location1, speed1)
         >>> d = Dispatcher()
-        >>> d.driver_register.append(driver1)
+        >>> m = Monitor()
         >>> timestamp1 = 4
+        >>> RiderRequest(timestamp1, rider1).do(d, m)
+        []
         >>> event1 = DriverRequest(timestamp1, driver1)
-        >>> timestamp2 = event1.timestamp + driver1.get_travel_time(rider1.origin)
-        >>> event2 = Pickup(timestamp2, rider1, driver1)
+        >>> event2 = event1.do(d, m)[0]
+        >>> print(event2)
+        8 -- John Doe: Pickup Jane Doe
+        >>> len(event2.do(d, m))
+        1
         >>> rider1.status
-        "satisfied"
+        'satisfied'
          """
         events = []
         self.driver.end_drive()
@@ -356,8 +445,10 @@ class Pickup(Event):
                            self.driver.id, self.rider.origin)
             travel_time = self.driver.start_ride(self.rider)
             self.rider.status = SATISFIED
+            dispatcher.clear_deadline(self.rider)
             events.append(Dropoff(self.timestamp + travel_time, self.rider,
                                   self.driver))
+        dispatcher.update_driver(self.driver)
 
         return events
 
@@ -379,7 +470,7 @@ class Dropoff(Event):
     driver: Driver
     rider: Rider
 
-    def __init__(self, timestamp: int, driver: Driver, rider: Rider) -> None:
+    def __init__(self, timestamp: int, rider: Rider, driver: Driver) -> None:
         """Initialize a Dropoff event.
         """
         super().__init__(timestamp)
@@ -394,6 +485,7 @@ class Dropoff(Event):
         """
         events = []
         self.driver.end_ride()
+        dispatcher.update_driver(self.driver)
         events.append(DriverRequest(self.timestamp, self.driver))
 
         monitor.notify(self.timestamp, RIDER, DROPOFF,
@@ -418,7 +510,20 @@ def create_event_list(filename: str) -> List[Event]:
 
     filename: The name of a file that contains the list of events.
     """
-    events = []
+    return list(iter_events(filename))
+
+
+def iter_events(filename: str) -> Iterator[Event]:
+    """Yield the Events in <filename> one at a time, in file order.
+
+    Only the current line and event are held in memory, so this can feed a
+    streaming Simulation.run with trace files of any size.
+
+    Precondition: the file stored at <filename> is in the format specified
+    by the assignment handout.
+
+    filename: The name of a file that contains the list of events.
+    """
     with open(filename, "r") as file:
         for line in file:
             line = line.strip()
@@ -442,10 +547,9 @@ def create_event_list(filename: str) -> List[Event]:
                 speed = int(tokens[4])
                 identification = tokens[2]
                 location = deserialize_location(tokens[3])
-                event_request = DriverRequest(timestamp, Driver(identification,
-                                                                location,
-                                                                speed))
-                events.append(event_request)
+                yield DriverRequest(timestamp, Driver(identification,
+                                                      location,
+                                                      speed))
 
             elif event_type == "RiderRequest":
                 origin = deserialize_location(tokens[3])
@@ -453,13 +557,10 @@ def create_event_list(filename: str) -> List[Event]:
                 patience = int(tokens[5])
                 identification = tokens[2]
                 # Create a RiderRequest event.
-                event_request = RiderRequest(timestamp, Rider(identification,
-                                                              origin,
-                                                              destination,
-                                                              patience))
-
-                events.append(event_request)
-    return events
+                yield RiderRequest(timestamp, Rider(identification,
+                                                    origin,
+                                                    destination,
+                                                    patience))
 
 
 if __name__ == '__main__':
@@ -467,6 +568,6 @@ if __name__ == '__main__':
 
     python_ta.check_all(
         config={
-            'allowed-io': ['create_event_list'],
-            'extra-imports': ['rider', 'dispatcher', 'driver',
+            'allowed-io': ['iter_events'],
+            'extra-imports': ['itertools', 'rider', 'dispatcher', 'driver',
                               'location', 'monitor']})
@@ -1,12 +1,18 @@
 """Locations for the simulation"""
 
 from __future__ import annotations
+from typing import Dict, Tuple
 
 
 class Location:
     """A two-dimensional location.
 
+    Locations have no __dict__, and equal locations hash equally, so they
+    can be used as dictionary keys. Locations made by intern_location are
+    shared between everyone who asks for the same coordinates, so no
+    location should be changed after it is made.
     """
+    __slots__ = ('row', 'column')
     row: int
     column: int
 
@@ -31,11 +37,37 @@ class Location:
         """Return True if self equals other, and false otherwise.
 
         """
-        if isinstance(other, Location):
+        if self is other:
+            return True
+        elif isinstance(other, Location):
             return self.row == other.row and self.column == other.column
         else:
             return False
 
+    def __hash__(self) -> int:
+        """Return a hash of this location's coordinates.
+
+        >>> hash(Location(2, 1)) == hash(Location(2, 1))
+        True
+        """
+        return hash((self.row, self.column))
+
+
+_interned: Dict[Tuple[int, int], Location] = {}
+
+
+def intern_location(row: int, column: int) -> Location:
+    """Return the shared Location at <row> and <column>, making it the
+    first time it is asked for.
+
+    >>> intern_location(4, 6) is intern_location(4, 6)
+    True
+    """
+    location = _interned.get((row, column))
+    if location is None:
+        location = _interned[(row, column)] = Location(row, column)
+    return location
+
 
 def manhattan_distance(origin: Location, destination: Location) -> int:
     """Return the Manhattan distance between the origin and the destination.
@@ -51,12 +83,13 @@ def deserialize_location(location_str: str) -> Location:
 
     >>> print(deserialize_location('4, 6'))
     (4, 6)
+    >>> deserialize_location('4,6') is deserialize_location('4, 6')
+    True
     """
-    deserialize_row = int(location_str.split(',')[0])
-    deserialize_column = int(location_str.split(',')[1])
-    return Location(deserialize_row, deserialize_column)
+    deserialize_row, deserialize_column = location_str.split(',')
+    return intern_location(int(deserialize_row), int(deserialize_column))
 
 
 if __name__ == '__main__':
     import python_ta
-    python_ta.check_all()
+    python_ta.check_all(config={'extra-imports': ['typing']})
@@ -1,7 +1,7 @@
 """
-The Monitor module contains the Monitor class, the Activity class,
-and a collection of constants. Together the elements of the module
-help keep a record of activities that have occurred.
+The Monitor module contains the Monitor class, the StreamingMonitor class,
+the Activity class, and a collection of constants. Together the elements of
+the module help keep a record of activities that have occurred.
 
 Activities fall into two categories: Rider activities and Driver
 activities. Each activity also has a description, which is one of
@@ -14,10 +14,16 @@ REQUEST: A constant used for the request activity description.
 CANCEL: A constant used for the cancel activity description.
 PICKUP: A constant used for the pickup activity description.
 DROP OFF: A constant used for the drop-off activity description.
+WAIT_TIME: The name of the distribution of rider wait times.
+DEADHEAD_DISTANCE: The name of the distribution of distances driven by
+    drivers between two activities without a rider.
+RIDE_DISTANCE: The name of the distribution of distances driven by drivers
+    between a pickup and their next activity.
 """
 
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Tuple
 from location import Location, manhattan_distance
+from sketch import QuantileSketch
 
 RIDER = "rider"
 DRIVER = "driver"
@@ -27,6 +33,10 @@ CANCEL = "cancel"
 PICKUP = "pickup"
 DROPOFF = "dropoff"
 
+WAIT_TIME = "rider_wait_time"
+DEADHEAD_DISTANCE = "driver_deadhead_distance"
+RIDE_DISTANCE = "driver_ride_distance"
+
 
 class Activity:
     """An activity that occurs in the simulation.
@@ -65,6 +75,12 @@ class Monitor:
     #       A dictionary whose key is a category, and value is another
     #       dictionary. The key of the second dictionary is an identifier
     #       and its value is a list of Activities.
+    _sketches: Dict[str, QuantileSketch]
+    #       The distribution of every wait time and leg distance so far,
+    #       keyed by WAIT_TIME, DEADHEAD_DISTANCE and RIDE_DISTANCE.
+    _observers: List[Callable[[int, str, float], None]]
+    #       The functions called with the time, the name and the value of
+    #       every wait time and leg distance, as it is observed.
 
     def __init__(self) -> None:
         """Initialize a Monitor.
@@ -75,6 +91,10 @@ class Monitor:
             DRIVER: {}
         }
         """@type _activities: dict[str, dict[str, list[Activity]]]"""
+        self._sketches = {WAIT_TIME: QuantileSketch(),
+                          DEADHEAD_DISTANCE: QuantileSketch(),
+                          RIDE_DISTANCE: QuantileSketch()}
+        self._observers = []
 
     def __str__(self) -> str:
         """Return a string representation.
@@ -97,8 +117,53 @@ class Monitor:
         if identifier not in self._activities[category]:
             self._activities[category][identifier] = []
 
+        activities = self._activities[category][identifier]
+        if category == RIDER:
+            if len(activities) == 1:
+                self._observe(timestamp, WAIT_TIME,
+                              timestamp - activities[0].time)
+        elif activities:
+            self._observe_leg(timestamp, activities[-1].location, location,
+                              activities[-1].description == PICKUP)
+
         activity = Activity(timestamp, description, identifier, location)
-        self._activities[category][identifier].append(activity)
+        activities.append(activity)
+
+    def _observe_leg(self, timestamp: int, start: Location, end: Location,
+                     ride: bool) -> None:
+        """Record that a driver drove from <start> to <end>, arriving at
+        <timestamp>, on a ride if <ride> is True.
+
+        """
+        self._observe(timestamp, RIDE_DISTANCE if ride else DEADHEAD_DISTANCE,
+                      manhattan_distance(start, end))
+
+    def _observe(self, timestamp: int, name: str, value: float) -> None:
+        """Record that <value> of the distribution <name> was observed at
+        <timestamp>, and pass it on to the observers.
+
+        """
+        self._sketches[name].add(value)
+        for observer in self._observers:
+            observer(timestamp, name, value)
+
+    def add_observer(self, observer: Callable[[int, str, float], None]
+                     ) -> None:
+        """Call <observer> with the time, the name and the value of every
+        wait time and leg distance observed from now on.
+
+        The names are WAIT_TIME, DEADHEAD_DISTANCE and RIDE_DISTANCE, as in
+        sketches().
+
+        >>> m = Monitor()
+        >>> seen = []
+        >>> m.add_observer(lambda *observation: seen.append(observation))
+        >>> m.notify(0, RIDER, REQUEST, 'Ann', Location(0, 0))
+        >>> m.notify(4, RIDER, PICKUP, 'Ann', Location(0, 0))
+        >>> seen
+        [(4, 'rider_wait_time', 4)]
+        """
+        self._observers.append(observer)
 
     def report(self) -> Dict[str, float]:
         """Return a report of the activities that have occurred.
@@ -108,6 +173,31 @@ class Monitor:
                 "driver_total_distance": self._average_total_distance(),
                 "driver_ride_distance": self._average_ride_distance()}
 
+    def sketches(self) -> Dict[str, QuantileSketch]:
+        """Return the distributions of rider wait times, deadhead leg
+        distances and ride leg distances, keyed by WAIT_TIME,
+        DEADHEAD_DISTANCE and RIDE_DISTANCE.
+
+        The sketches can be merged with those of other runs.
+        """
+        return self._sketches
+
+    def tail_report(self, quantiles: Tuple[float, ...] = (0.5, 0.95, 0.99)
+                    ) -> Dict[str, float]:
+        """Return the <quantiles> of each distribution in sketches(), keyed
+        by the name of the distribution and the percentile, as in
+        'rider_wait_time_p95'.
+
+        >>> m = Monitor()
+        >>> m.notify(0, RIDER, REQUEST, 'Ann', Location(0, 0))
+        >>> m.notify(4, RIDER, PICKUP, 'Ann', Location(0, 0))
+        >>> m.tail_report((0.5,))['rider_wait_time_p50']
+        4
+        """
+        return {'{}_p{:g}'.format(name, q * 100): sketch.quantile(q)
+                for name, sketch in self.sketches().items()
+                for q in quantiles}
+
     def _average_wait_time(self) -> float:
         """Return the average wait time of riders that have either been picked
         up or have cancelled their ride.
@@ -176,10 +266,107 @@ class Monitor:
         return total_distance / len(self._activities[DRIVER])
 
 
+class StreamingMonitor(Monitor):
+    """A monitor that keeps running totals instead of a record of every
+    activity, so that its memory use does not grow with the length of the
+    simulation and its report takes constant time.
+
+    It reports the same statistics as a Monitor notified of the same
+    activities.
+    """
+
+    # === Private Attributes ===
+    _requested: Dict[str, Optional[int]]
+    #     For each rider, the time of their first activity, or None once
+    #     their wait time has been counted.
+    _last: Dict[str, Tuple[Location, bool]]
+    #     For each driver, the location of their latest activity, and whether
+    #     that activity was a pickup.
+    _wait_time: int
+    #     The total wait time of the riders whose wait has been counted.
+    _wait_count: int
+    #     The number of riders whose wait has been counted.
+    _total_distance: int
+    #     The total distance driven by all drivers.
+    _ride_distance: int
+    #     The total distance driven by all drivers on rides.
+
+    def __init__(self) -> None:
+        """Initialize a StreamingMonitor.
+
+        """
+        Monitor.__init__(self)
+        self._requested = {}
+        self._last = {}
+        self._wait_time = 0
+        self._wait_count = 0
+        self._total_distance = 0
+        self._ride_distance = 0
+
+    def __str__(self) -> str:
+        """Return a string representation.
+
+        """
+        return "Monitor ({} drivers, {} riders)".format(
+            len(self._last), len(self._requested))
+
+    def notify(self, timestamp: int, category: str, description: str,
+               identifier: str, location: Location) -> None:
+        """Notify the monitor of the activity.
+
+        timestamp: The time of the activity.
+        category: The category (DRIVER or RIDER) for the activity.
+        description: A description (REQUEST | CANCEL | PICKUP | DROP_OFF)
+            of the activity.
+        identifier: The identifier for the actor.
+        location: The location of the activity.
+        """
+        if category == RIDER:
+            if identifier not in self._requested:
+                self._requested[identifier] = timestamp
+            else:
+                requested = self._requested[identifier]
+                if requested is not None:
+                    # The second activity ends the wait, as in Monitor.
+                    self._wait_time += timestamp - requested
+                    self._wait_count += 1
+                    self._requested[identifier] = None
+                    self._observe(timestamp, WAIT_TIME, timestamp - requested)
+        else:
+            last = self._last.get(identifier)
+            if last is not None:
+                distance = manhattan_distance(location, last[0])
+                self._total_distance += distance
+                if last[1]:
+                    self._ride_distance += distance
+                self._observe(timestamp, RIDE_DISTANCE if last[1]
+                              else DEADHEAD_DISTANCE, distance)
+            self._last[identifier] = (location, description == PICKUP)
+
+    def _average_wait_time(self) -> float:
+        """Return the average wait time of riders that have either been picked
+        up or have cancelled their ride.
+
+        """
+        return self._wait_time / self._wait_count
+
+    def _average_total_distance(self) -> float:
+        """Return the average distance drivers have driven.
+
+        """
+        return self._total_distance / len(self._last)
+
+    def _average_ride_distance(self) -> float:
+        """Return the average distance drivers have driven on rides.
+
+        """
+        return self._ride_distance / len(self._last)
+
+
 if __name__ == "__main__":
     import python_ta
 
     python_ta.check_all(
         config={
             'max-args': 6,
-            'extra-imports': ['typing', 'location']})
+            'extra-imports': ['typing', 'location', 'sketch']})
@@ -0,0 +1,181 @@
+"""
+The profiler module contains the Profiler class, which records where the
+time of a simulation run goes, and the Timing class, which summarizes the
+durations of one kind of operation.
+
+A Profiler is passed to a Simulation to instrument its run. Without one the
+simulation runs its usual loop, so the instrumentation costs nothing when it
+is not in use.
+
+=== Constants ===
+POP: The phase of removing the next event from the event queue, or pulling
+    it from the input of a streaming run.
+DO: The phase of doing an event.
+PUSH: The phase of adding the events an event spawns to the event queue.
+NOTIFY: The phase of notifying the monitor of an activity. Notifications
+    happen while an event is done, so this time is also counted in DO.
+PHASES: Every phase, in the order they happen.
+"""
+
+from time import perf_counter
+from typing import Callable, Dict, List, Tuple
+
+POP = "pop"
+DO = "do"
+PUSH = "push"
+NOTIFY = "notify"
+
+PHASES = (POP, DO, PUSH, NOTIFY)
+
+
+class Timing:
+    """A summary of the durations of one kind of operation.
+
+    === Attributes ===
+    count: The number of operations.
+    total: The total duration of the operations, in seconds.
+    max: The longest duration of an operation, in seconds.
+    """
+
+    __slots__ = ('count', 'total', 'max')
+
+    count: int
+    total: float
+    max: float
+
+    def __init__(self) -> None:
+        """Initialize a Timing of no operations.
+
+        """
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration: float) -> None:
+        """Record an operation that took <duration> seconds.
+
+        >>> timing = Timing()
+        >>> timing.add(0.5)
+        >>> timing.add(1.5)
+        >>> timing.count, timing.total, timing.max, timing.mean()
+        (2, 2.0, 1.5, 1.0)
+        """
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def mean(self) -> float:
+        """Return the mean duration of an operation, or 0 if there are none.
+
+        """
+        return self.total / self.count if self.count else 0.0
+
+
+class Profiler:
+    """A record of the time spent in each phase of a simulation run, per
+    event class, and of the depth of the event queue over time.
+
+    === Attributes ===
+    depth_interval: The number of events done between two samples of the
+        queue depth.
+    timings: The Timing of each phase of each event class, keyed by
+        (event class name, phase).
+    depths: The samples of the queue depth, as (timestamp, depth) pairs in
+        the order they were taken.
+    """
+
+    depth_interval: int
+    timings: Dict[Tuple[str, str], Timing]
+    depths: List[Tuple[int, int]]
+
+    def __init__(self, depth_interval: int = 1000) -> None:
+        """Initialize a Profiler that samples the queue depth every
+        <depth_interval> events.
+
+        Precondition: depth_interval >= 1
+        """
+        self.depth_interval = depth_interval
+        self.timings = {}
+        self.depths = []
+
+    def timing(self, event_class: str, phase: str) -> Timing:
+        """Return the Timing of <phase> for events of <event_class>,
+        creating it if there is none yet.
+
+        """
+        key = (event_class, phase)
+        timing = self.timings.get(key)
+        if timing is None:
+            timing = self.timings[key] = Timing()
+        return timing
+
+    def timed(self, function: Callable, timing: Timing) -> Callable:
+        """Return a function that calls <function> and adds the duration of
+        each call to <timing>.
+
+        """
+        def wrapper(*args: object) -> object:
+            start = perf_counter()
+            result = function(*args)
+            timing.add(perf_counter() - start)
+            return result
+        return wrapper
+
+    def sample_depth(self, timestamp: int, depth: int) -> None:
+        """Record that the event queue held <depth> events at <timestamp>.
+
+        """
+        self.depths.append((timestamp, depth))
+
+    def phase_totals(self) -> Dict[str, Timing]:
+        """Return the Timing of each phase over all event classes.
+
+        >>> profiler = Profiler()
+        >>> profiler.timing('Pickup', DO).add(1.0)
+        >>> profiler.timing('Dropoff', DO).add(3.0)
+        >>> totals = profiler.phase_totals()
+        >>> totals[DO].count, totals[DO].total, totals[DO].max
+        (2, 4.0, 3.0)
+        """
+        totals = {}
+        for (_, phase), timing in self.timings.items():
+            total = totals.get(phase)
+            if total is None:
+                total = totals[phase] = Timing()
+            total.count += timing.count
+            total.total += timing.total
+            total.max = max(total.max, timing.max)
+        return totals
+
+    def report(self) -> List[Dict[str, object]]:
+        """Return one row per event class and phase, with its count, total,
+        mean and max duration in seconds, the most time-consuming first.
+
+        """
+        rows = [{'event': event_class, 'phase': phase, 'count': timing.count,
+                 'total': timing.total, 'mean': timing.mean(),
+                 'max': timing.max}
+                for (event_class, phase), timing in self.timings.items()
+                if timing.count]
+        rows.sort(key=lambda row: row['total'], reverse=True)
+        return rows
+
+    def __str__(self) -> str:
+        """Return the report of this Profiler as a table.
+
+        """
+        lines = ['{:<16} {:<7} {:>10} {:>12} {:>12} {:>12}'.format(
+            'event', 'phase', 'count', 'total (s)', 'mean (us)', 'max (us)')]
+        for row in self.report():
+            lines.append('{:<16} {:<7} {:>10} {:>12.6f} {:>12.2f} {:>12.2f}'
+                         .format(row['event'], row['phase'], row['count'],
+                                 row['total'], row['mean'] * 1e6,
+                                 row['max'] * 1e6))
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={'extra-imports': ['time', 'typing']})
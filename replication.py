@@ -0,0 +1,175 @@
+"""
+The replication module runs many independent simulations of the same
+scenario in parallel, each on randomly perturbed inputs, and summarizes
+their reports.
+
+The base trace is parsed once and shipped to each worker process once, in
+the binary trace format. Every replication decodes its own fresh events
+from it, so no state is shared between runs.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from math import sqrt
+from random import Random
+from statistics import NormalDist, mean, stdev
+from typing import Callable, Dict, List, Optional
+from binary_trace import RIDER_REQUEST, Record, TraceReader, decode_record, \
+    read_trace
+from monitor import StreamingMonitor
+from simulation import Simulation
+
+Perturbation = Callable[[List[Record], Random], List[Record]]
+
+# The base trace of the current worker process, set by init_worker.
+_trace: Optional[TraceReader] = None
+
+
+class Jitter:
+    """A perturbation that moves each rider request by a random number of
+    ticks, and scales each rider's patience by a random factor.
+
+    === Attributes ===
+    spread: The largest number of ticks a request is moved, earlier or
+        later. No request is moved before tick 0.
+    patience_spread: The largest fraction by which a patience is scaled up
+        or down.
+    """
+
+    spread: int
+    patience_spread: float
+
+    def __init__(self, spread: int = 2, patience_spread: float = 0.1) -> None:
+        """Initialize a Jitter.
+
+        """
+        self.spread = spread
+        self.patience_spread = patience_spread
+
+    def __call__(self, records: List[Record], rand: Random) -> List[Record]:
+        """Return a perturbed copy of <records>, using <rand> as the only
+        source of randomness.
+
+        """
+        perturbed = []
+        for record in records:
+            if record[1] == RIDER_REQUEST:
+                timestamp = max(0, record[0] + rand.randint(-self.spread,
+                                                            self.spread))
+                scale = 1 + rand.uniform(-self.patience_spread,
+                                         self.patience_spread)
+                record = (timestamp,) + record[1:7] + \
+                    (max(0, round(record[7] * scale)),)
+            perturbed.append(record)
+        return perturbed
+
+
+def replicate(filename: str, replications: int, seed: int = 0,
+              perturbation: Optional[Perturbation] = None,
+              max_workers: Optional[int] = None) -> List[Dict[str, float]]:
+    """Return the reports of <replications> simulations of the trace in
+    <filename>, run in parallel across <max_workers> processes.
+
+    Replication i perturbs the trace with <perturbation> and a random
+    number generator seeded from <seed> and i alone, so the results do not
+    depend on the number of workers or the order the runs finish in.
+    Without a perturbation, every replication runs the unchanged trace.
+
+    filename: A text or binary trace.
+    perturbation: A picklable callable, such as a Jitter.
+    """
+    trace = read_trace(filename)
+    with ProcessPoolExecutor(max_workers, initializer=init_worker,
+                             initargs=(trace,)) as executor:
+        return list(executor.map(_replicate,
+                                 [seed] * replications,
+                                 range(replications),
+                                 [perturbation] * replications))
+
+
+def summarize(reports: List[Dict[str, float]],
+              confidence: float = 0.95) -> Dict[str, Dict[str, float]]:
+    """Return the mean, standard deviation and <confidence> interval of the
+    mean of each statistic in <reports>.
+
+    The interval uses the normal approximation, so it is most accurate with
+    many replications.
+
+    >>> summary = summarize([{'wait': 1.0}, {'wait': 3.0}])
+    >>> summary['wait']['mean'], summary['wait']['stdev']
+    (2.0, 1.4142135623730951)
+    >>> round(summary['wait']['low'], 3), round(summary['wait']['high'], 3)
+    (0.04, 3.96)
+    """
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    summary = {}
+    for name in reports[0]:
+        values = [report[name] for report in reports]
+        average = mean(values)
+        deviation = stdev(values) if len(values) > 1 else 0.0
+        half_width = z * deviation / sqrt(len(values))
+        summary[name] = {'mean': average, 'stdev': deviation,
+                         'low': average - half_width,
+                         'high': average + half_width}
+    return summary
+
+
+def run_replications(filename: str, replications: int, seed: int = 0,
+                     perturbation: Optional[Perturbation] = None,
+                     max_workers: Optional[int] = None,
+                     confidence: float = 0.95) -> Dict[str, Dict[str, float]]:
+    """Run <replications> perturbed simulations of the trace in <filename>
+    in parallel, and return the summary of their reports.
+
+    See replicate and summarize.
+    """
+    return summarize(replicate(filename, replications, seed, perturbation,
+                               max_workers), confidence)
+
+
+def init_worker(trace: bytes) -> None:
+    """Keep the binary <trace> as the base trace of this worker process.
+
+    This is the initializer of the process pools that run simulations.
+    """
+    global _trace
+    _trace = TraceReader(trace)
+
+
+def _replicate(seed: int, index: int,
+               perturbation: Optional[Perturbation]) -> Dict[str, float]:
+    """Run replication <index> of the base trace of this process, and return
+    its report.
+
+    """
+    records = list(worker_trace().records())
+    if perturbation is not None:
+        records = perturbation(records, Random('{}/{}'.format(seed, index)))
+    return simulate_records(records, worker_trace().ids())
+
+
+def worker_trace() -> TraceReader:
+    """Return the base trace of this worker process.
+
+    Precondition: init_worker has been called in this process.
+    """
+    return _trace
+
+
+def simulate_records(records: List[Record],
+                     ids: List[str]) -> Dict[str, float]:
+    """Return the report of a simulation of fresh events decoded from
+    <records>, whose ids index into <ids>.
+
+    """
+    events = [decode_record(record, ids) for record in records]
+    return Simulation(monitor=StreamingMonitor()).run(events)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(
+        config={
+            'extra-imports': ['concurrent.futures', 'math', 'random',
+                              'statistics', 'typing', 'binary_trace',
+                              'monitor', 'simulation']})
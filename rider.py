@@ -46,21 +46,29 @@ class Rider:
                f' {self.destination}, Patience {self.patience}, Status: ' \
                f'{self.status}'
 
-    def __eq__(self, other: Location) -> bool:
-        """Evaluate if one rider is equivalent to another by assessing if they
-        other is Rider then assessing if they have the same id, origin,
-        destination, and status.
+    def __eq__(self, other: object) -> bool:
+        """Return True iff other is a Rider with the same id as self.
+
+        A rider's id identifies them for the whole simulation, so riders are
+        compared by id alone, whatever their status.
+
+        >>> r = Rider('Eve', Location(1, 1), Location(2, 2), 10)
+        >>> s = Rider('Eve', Location(1, 1), Location(2, 2), 10)
+        >>> s.status = CANCELLED
+        >>> r == s
+        True
+        """
+        return isinstance(other, Rider) and self.id == other.id
+
+    def __hash__(self) -> int:
+        """Return a hash of this rider's id, so that riders can be kept in
+        sets and used as dictionary keys.
+
+        >>> r = Rider('Eve', Location(1, 1), Location(2, 2), 10)
+        >>> r in {Rider('Eve', Location(3, 3), Location(4, 4), 5)}
+        True
         """
-        if isinstance(other, Rider):
-            if self.patience == other.patience and self.id == other.id and \
-                    self.origin == other.origin and \
-                    self.destination == other.destination and \
-                    self.status == other.status:
-                return True
-            else:
-                return False
-        else:
-            return False
+        return hash(self.id)
 
 
 if __name__ == '__main__':
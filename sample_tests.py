@@ -1,12 +1,52 @@
+import random
 import pytest
 from location import Location, deserialize_location
-from monitor import Monitor
+from monitor import Monitor, StreamingMonitor, WAIT_TIME, RIDE_DISTANCE
 from dispatcher import Dispatcher
 from simulation import Simulation
-from event import create_event_list, RiderRequest, DriverRequest, Pickup, \
-    Dropoff, Cancellation
-from driver import Driver
+from event import create_event_list, iter_events, RiderRequest, \
+    DriverRequest, Pickup, Dropoff, Cancellation
+from driver import Driver, drive_time, travel_time
 from rider import Rider
+from container import PriorityQueue, CalendarQueue
+from spatial import DriverGrid
+from binary_trace import convert_text_trace, open_trace
+
+
+class RecordingQueue(CalendarQueue):
+    """A CalendarQueue that records the class name and timestamp of every
+    event added to it one at a time, and the most events it ever held.
+
+    """
+
+    def __init__(self) -> None:
+        CalendarQueue.__init__(self)
+        self.added = []
+        self.peak = 0
+
+    def add(self, item: object) -> None:
+        CalendarQueue.add(self, item)
+        self.added.append((type(item).__name__, item.timestamp))
+        self.peak = max(self.peak, len(self))
+
+    def added_at(self, name: str) -> list:
+        """Return the timestamps of the added events of class <name>.
+
+        """
+        return [timestamp for added, timestamp in self.added
+                if added == name]
+
+
+def finished_riders(monitor: Monitor) -> tuple:
+    """Return the number of riders who were picked up, and the number who
+    cancelled, in the run <monitor> observed.
+
+    Every rider who stops waiting is picked up or cancels, and every rider
+    picked up is dropped off by the end of a run.
+    """
+    sketches = monitor.sketches()
+    rides = sketches[RIDE_DISTANCE].count
+    return rides, sketches[WAIT_TIME].count - rides
 
 
 def test_location_print() -> None:
@@ -18,6 +58,15 @@ def test_location_print() -> None:
     assert str(location2) in ["(3,4)", "(3, 4)"]
 
 
+def test_location_interning() -> None:
+    """Tests that parsed locations are compact and shared"""
+    assert not hasattr(Location(1, 2), '__dict__')
+    assert {Location(1, 2): 'a'}[Location(1, 2)] == 'a'
+    events = create_event_list("events.txt")
+    # Amaranth starts at 1,1, where Almond asks to be picked up.
+    assert events[0].driver.location is events[6].rider.origin
+
+
 def test_event_creation() -> None:
     """ Tests for correct implementation of the event creations
     """
@@ -37,13 +86,26 @@ def test_event_creation() -> None:
 def test_ride() -> None:
     """ Tests that driver correctly starts its ride
     """
-    rider = Rider('Eve', 100, Location(2, 4), Location(5, 7))
+    rider = Rider('Eve', Location(2, 4), Location(5, 7), 100)
     driver = Driver('Abel', Location(2, 4), 3)
 
     travel_time = driver.start_ride(rider)
     assert travel_time == 2
 
 
+def test_travel_time_cache() -> None:
+    """ Tests that travel times over the same distance at the same speed are
+    served from the cache, wherever the drives are
+    """
+    drive_time.cache_clear()
+    driver = Driver('Abel', Location(2, 4), 3)
+    assert driver.get_travel_time(Location(5, 7)) == 2
+    assert driver.get_travel_time(Location(8, 4)) == 2
+    assert travel_time(0, 0, 3, 3, 3) == 2
+    info = drive_time.cache_info()
+    assert (info.hits, info.misses) == (2, 1)
+
+
 def test_simulation_run() -> None:
     """Test simulation run on a basic set of events"""
     events = create_event_list("events.txt")
@@ -92,5 +154,498 @@ def test_special_events() -> None:
     assert rider.status == 'cancelled'
 
 
+def test_priority_queue_fifo_ties() -> None:
+    """Test that events with equal timestamps leave the queue in FIFO order"""
+    events = create_event_list("events.txt")
+    pq = PriorityQueue()
+    pq.extend(reversed(events[6:]))
+    for event in events[:6]:
+        pq.add(event)
+    assert len(pq) == 12
+    assert pq.peek() is events[-6]
+
+    removed = []
+    while not pq.is_empty():
+        removed.append(pq.remove())
+    expected = [events[6]] + events[:6] + events[7:]
+    assert all(a is b for a, b in zip(removed, expected))
+
+
+def test_simulation_queue_choice() -> None:
+    """Test that both event queues drive the simulation identically"""
+    calendar = Simulation(CalendarQueue()).run(create_event_list("events.txt"))
+    heap = Simulation(PriorityQueue()).run(create_event_list("events.txt"))
+    assert calendar == heap
+
+
+def test_bulk_driver_registration() -> None:
+    """Test that registering drivers in bulk keeps the register duplicate
+    free and in order"""
+    events = create_event_list("events.txt")
+    drivers = [event.driver for event in events[:6]]
+    dispatcher = Dispatcher()
+    dispatcher.register_drivers(drivers[:3])
+    dispatcher.register_drivers(drivers)
+    for driver in drivers:
+        assert dispatcher.request_rider(driver) is None
+    assert dispatcher.driver_register == drivers
+
+
+def test_driver_grid_matches_linear_scan() -> None:
+    """Test that the grid finds the same fastest driver as a scan over
+    every driver in it"""
+    rand = random.Random(148)
+    drivers = [Driver(str(i), Location(rand.randrange(60), rand.randrange(60)),
+                      rand.randint(1, 4)) for i in range(200)]
+    grid = DriverGrid(5)
+    for driver in drivers:
+        grid.add(driver)
+    for driver in drivers[::3]:
+        grid.remove(driver)
+    idle = [driver for driver in drivers if driver in grid]
+    assert len(idle) == len(grid) == 133
+
+    for _ in range(100):
+        target = Location(rand.randrange(70), rand.randrange(70))
+        expected = None
+        for driver in idle:
+            if expected is None or driver.get_travel_time(target) < \
+                    expected.get_travel_time(target):
+                expected = driver
+        assert grid.fastest(target) is expected
+    assert all(driver.destination is None for driver in drivers)
+
+
+def test_dispatcher_assigns_idle_drivers_only() -> None:
+    """Test that a busy driver is never handed to a second rider"""
+    dispatcher = Dispatcher()
+    driver = Driver('Abel', Location(1, 1), 1)
+    dispatcher.request_rider(driver)
+    first = Rider('Ann', Location(1, 2), Location(3, 3), 5)
+    second = Rider('Bob', Location(1, 1), Location(3, 3), 5)
+    assert dispatcher.request_driver(first) is driver
+    assert dispatcher.request_driver(second) is None
+    assert list(dispatcher.riders_waiting_list) == [second]
+
+    driver.start_drive(first.origin)
+    driver.end_drive()
+    dispatcher.update_driver(driver)
+    assert dispatcher.request_driver(second) is driver
+
+
+def test_waiting_list_cancellation() -> None:
+    """Test that cancelled riders leave the waiting list and the rest are
+    served first come first served"""
+    dispatcher = Dispatcher()
+    riders = [Rider(str(i), Location(1, 1), Location(2, 2), 5)
+              for i in range(100)]
+    for rider in riders:
+        assert dispatcher.request_driver(rider) is None
+    for rider in riders[1::2]:
+        dispatcher.cancel_ride(rider)
+        dispatcher.cancel_ride(rider)
+    assert len(dispatcher.riders_waiting_list) == 50
+
+    driver = Driver('Abel', Location(1, 1), 1)
+    for rider in riders[::2]:
+        assert dispatcher.request_rider(driver) is rider
+        driver.is_idle = True
+    assert dispatcher.request_rider(driver) is None
+
+
+def test_identity_hashing() -> None:
+    """Test that drivers and riders are keyed by id, whatever their state"""
+    driver = Driver('Abel', Location(2, 4), 3)
+    rider = Rider('Eve', Location(2, 4), Location(5, 7), 100)
+    drivers, riders = {driver}, {rider}
+    driver.start_ride(rider)
+    rider.status = 'satisfied'
+    assert driver in drivers and rider in riders
+    assert Driver('Abel', Location(0, 0), 1) in drivers
+    assert Driver('Cain', Location(2, 4), 3) not in drivers
+
+
+def test_streaming_run() -> None:
+    """Test that a streaming run over the lazy reader matches a batch run"""
+    batch = Simulation().run(create_event_list("events.txt"))
+    stream = Simulation().run(iter_events("events.txt"), streaming=True)
+    assert stream == batch
+
+
+def test_binary_trace_round_trip(tmp_path) -> None:
+    """Test that a converted binary trace decodes to the same events and
+    simulates to the same report"""
+    filename = str(tmp_path / "events.bin")
+    assert convert_text_trace("events.txt", filename) == 12
+
+    with open_trace(filename) as trace:
+        assert len(trace) == 12
+        assert str(trace.event(0)) == str(create_event_list("events.txt")[0])
+        assert [str(event) for event in trace] == \
+               [str(event) for event in create_event_list("events.txt")]
+        report = Simulation().run(iter(trace), streaming=True)
+    assert report == Simulation().run(create_event_list("events.txt"))
+
+    # Closing the trace while an iterator over it is alive must not raise
+    # over the error that ended the run early.
+    with pytest.raises(KeyError):
+        with open_trace(filename) as trace:
+            events, records = iter(trace), trace.records()
+            next(events), next(records)
+            raise KeyError('stopped')
+
+
+def test_bulk_parser_matches_create_event_list(tmp_path) -> None:
+    """Test that the vectorized parser reads the same events, and that its
+    records can be written as a binary trace"""
+    pytest.importorskip("numpy")
+    from bulk_parser import parse_event_file
+
+    expected = [str(event) for event in create_event_list("events.txt")]
+    arrays = parse_event_file("events.txt")
+    assert len(arrays) == 12
+    assert [str(event) for event in arrays] == expected
+    assert list(arrays.records['timestamp'][-3:]) == [15, 20, 25]
+
+    filename = str(tmp_path / "events.bin")
+    arrays.to_binary(filename)
+    with open_trace(filename) as trace:
+        assert [str(event) for event in trace] == expected
+
+
+def test_streaming_monitor_report() -> None:
+    """Test that the running totals give the same report as the full
+    activity log"""
+    full = Simulation().run(create_event_list("events.txt"))
+    streaming = Simulation(monitor=StreamingMonitor()).run(
+        create_event_list("events.txt"))
+    assert streaming == pytest.approx(full)
+
+
+def test_columnar_monitor_report() -> None:
+    """Test that the columnar log gives the same report as the full
+    activity log"""
+    pytest.importorskip("numpy")
+    from activity_log import ColumnarMonitor
+
+    full = Simulation().run(create_event_list("events.txt"))
+    columnar = Simulation(monitor=ColumnarMonitor()).run(
+        create_event_list("events.txt"))
+    assert columnar == pytest.approx(full)
+
+
+def test_tail_report_matches_across_monitors() -> None:
+    """Test that every monitor reports the same tail statistics, and that
+    sketches of two runs merge"""
+    pytest.importorskip("numpy")
+    from activity_log import ColumnarMonitor
+
+    reports = []
+    for monitor in (Monitor(), StreamingMonitor(), ColumnarMonitor()):
+        Simulation(monitor=monitor).run(create_event_list("events.txt"))
+        reports.append(monitor.tail_report())
+    assert len(reports[0]) == 9
+    assert reports[0]['rider_wait_time_p50'] == 0
+    assert reports[0] == reports[1] == reports[2]
+
+    sketch = monitor.sketches()['rider_wait_time']
+    count = len(sketch)
+    sketch.merge(StreamingMonitor().sketches()['rider_wait_time'])
+    assert len(sketch) == count
+
+
+def test_replications_are_deterministic() -> None:
+    """Test that replications depend only on the seed and their index"""
+    from replication import Jitter, replicate, summarize
+
+    base = Simulation().run(create_event_list("events.txt"))
+    assert replicate("events.txt", 2, max_workers=2) == [base, base]
+
+    first = replicate("events.txt", 4, seed=7, perturbation=Jitter(),
+                      max_workers=2)
+    second = replicate("events.txt", 4, seed=7, perturbation=Jitter(),
+                       max_workers=1)
+    assert first == second
+    summary = summarize(first)
+    assert set(summary) == set(base)
+    for stats in summary.values():
+        assert stats['low'] <= stats['mean'] <= stats['high']
+
+
+def test_sweep_table(tmp_path) -> None:
+    """Test that a sweep runs every configuration and writes the table"""
+    from sweep import sweep
+
+    output = str(tmp_path / "sweep.csv")
+    rows = sweep("events.txt", drivers=[None, 3, 9],
+                 speed_multipliers=[1.0, 2.0], output=output, max_workers=2)
+    assert len(rows) == 6
+    assert rows[0]['rider_wait_time'] == pytest.approx(0.5)
+    assert rows[0]['drivers'] is None and rows[-1]['speed_multiplier'] == 2.0
+    with open(output) as file:
+        lines = file.read().splitlines()
+    assert len(lines) == 7
+    assert lines[0].startswith('drivers,speed_multiplier,patience_scale,')
+
+
+def test_derive_records_without_drivers() -> None:
+    """Test that drivers cannot be derived from a trace without any"""
+    from binary_trace import RIDER_REQUEST
+    from sweep import derive_records
+
+    records = [(0, RIDER_REQUEST, 0, 1, 1, 2, 2, 5)]
+    assert derive_records(records, ['Ana'], 0)[0] == records
+    with pytest.raises(ValueError):
+        derive_records(records, ['Ana'], 2)
+
+
+def test_workload_generator(tmp_path) -> None:
+    """Test that a generated workload streams the same events it writes,
+    in timestamp order"""
+    from workload import Hotspot, Workload
+
+    workload = Workload(rows=30, columns=30, drivers=20, riders=500,
+                        arrival_rate=2.0, hotspots=[Hotspot(5, 5, 3.0)],
+                        seed=3)
+    filename = str(tmp_path / "workload.txt")
+    assert workload.write(filename) == 520
+
+    events = create_event_list(filename)
+    timestamps = [event.timestamp for event in events]
+    assert timestamps == sorted(timestamps)
+    assert [str(event) for event in workload.events()] == \
+           [str(event) for event in events]
+    assert Simulation().run(workload.events(), streaming=True) == \
+           Simulation().run(events)
+
+
+def test_benchmarks_flag_regressions(tmp_path) -> None:
+    """Test that the benchmark harness times every benchmark and reports
+    results slower than the baseline"""
+    import json
+    from benchmarks import BENCHMARKS, compare, main, run_benchmarks
+
+    results = run_benchmarks([200], repeat=1)
+    assert set(results) == set(BENCHMARKS)
+    assert all(result['200']['seconds'] > 0 for result in results.values())
+    assert compare(results, results) == []
+
+    baseline = str(tmp_path / "baseline.json")
+    faster = {name: {'200': {'seconds': 1e-9, 'us_per_event': 0.0}}
+              for name in results}
+    with open(baseline, 'w') as file:
+        json.dump({'results': faster}, file)
+    assert main(['--sizes', '200', '--repeat', '1', '--only',
+                 'priority_queue.add_remove', '--baseline', baseline]) == 1
+
+
+def test_profiled_run() -> None:
+    """Test that a profiled run gives the same report and times every
+    phase of every event class"""
+    from profiler import Profiler, POP, DO, PUSH, NOTIFY
+
+    profiler = Profiler(depth_interval=5)
+    monitor = Monitor()
+    events = create_event_list("events.txt")
+    assert Simulation(monitor=monitor, profiler=profiler).run(events) == \
+           Simulation().run(create_event_list("events.txt"))
+    assert 'notify' not in vars(monitor)
+
+    totals = profiler.phase_totals()
+    assert totals[POP].count == totals[PUSH].count
+    assert totals[DO].count == \
+           totals[POP].count + profiler.timing('Cancellation', DO).count
+    assert totals[NOTIFY].count > 0
+    assert profiler.timing('RiderRequest', DO).count == 6
+    assert len(profiler.depths) == totals[POP].count // 5
+
+
+def test_checkpoint_resume(tmp_path) -> None:
+    """Test that a run stopped after a checkpoint resumes to the same
+    report as a run that was never stopped"""
+    from checkpoint import Checkpointer
+
+    class StopAfterSave(Checkpointer):
+        def save(self, state: object) -> None:
+            Checkpointer.save(self, state)
+            self.wait()
+            raise RuntimeError('stopped')
+
+    filename = str(tmp_path / "run.ckpt")
+    expected = Simulation().run(create_event_list("events.txt"))
+    with pytest.raises(RuntimeError):
+        Simulation(checkpointer=StopAfterSave(filename, interval=10)).run(
+            create_event_list("events.txt"))
+    assert Simulation.resume(filename).run([]) == expected
+
+    checkpointer = Checkpointer(filename, interval=7)
+    assert Simulation(monitor=StreamingMonitor(),
+                      checkpointer=checkpointer).run(
+        create_event_list("events.txt")) == expected
+    with pytest.raises(ValueError):
+        Simulation(checkpointer=checkpointer).run(iter_events("events.txt"),
+                                                  streaming=True)
+
+
+def test_windowed_metrics(tmp_path) -> None:
+    """Test that tumbling windows partition the samples of a run, that
+    sliding windows overlap, and that windows can be written to CSV, once
+    each, even by a run resumed from a checkpoint"""
+    from checkpoint import Checkpointer
+    from windows import WindowedMetrics, CsvSink, IDLE_DRIVERS
+
+    tumbling, sliding = [], []
+    expected = Simulation().run(create_event_list("events.txt"))
+    monitor = StreamingMonitor()
+    assert Simulation(monitor=monitor,
+                      windows=WindowedMetrics(4, tumbling.append)).run(
+        create_event_list("events.txt")) == expected
+    assert [(window['start'], window['end']) for window in tumbling] == \
+           [(0, 4), (4, 8), (8, 12), (16, 20), (20, 24), (24, 28), (28, 32)]
+    waits = monitor.sketches()['rider_wait_time']
+    assert sum(window['rider_wait_time_count'] for window in tumbling) == \
+           waits.count
+    assert tumbling[0][IDLE_DRIVERS + '_max'] == 5
+
+    Simulation(windows=WindowedMetrics(4, sliding.append, slide=2)).run(
+        create_event_list("events.txt"))
+    assert sum(window['rider_wait_time_count'] for window in sliding) == \
+           2 * waits.count
+    assert sliding[0]['start'] == 0 and sliding[1]['start'] == 0
+
+    filename = str(tmp_path / "windows.csv")
+    Simulation(windows=WindowedMetrics(4, CsvSink(filename))).run(
+        create_event_list("events.txt"))
+    with open(filename) as file:
+        lines = file.read().splitlines()
+    assert len(lines) == len(tumbling) + 1
+    assert lines[0].startswith('start,end,rider_wait_time_count,')
+
+    class StopAtSecondSave(Checkpointer):
+        def save(self, state: object) -> None:
+            if self.saves:
+                raise RuntimeError('stopped')
+            self.saves += 1
+            Checkpointer.save(self, state)
+            self.wait()
+
+    resumed = str(tmp_path / "resumed.csv")
+    checkpoint = str(tmp_path / "run.ckpt")
+    checkpointer = StopAtSecondSave(checkpoint, interval=20)
+    checkpointer.saves = 0
+    sink = CsvSink(resumed)
+    with pytest.raises(RuntimeError):
+        Simulation(windows=WindowedMetrics(4, sink),
+                   checkpointer=checkpointer).run(
+            create_event_list("events.txt"))
+    sink.close()
+    assert Simulation.resume(checkpoint).run([]) == expected
+    with open(resumed) as file:
+        assert file.read().splitlines() == lines
+
+
+def test_windows_need_an_observable_monitor() -> None:
+    """Test that windowed metrics cannot be fed by a ColumnarMonitor"""
+    pytest.importorskip("numpy")
+    from activity_log import ColumnarMonitor
+    from windows import WindowedMetrics
+
+    with pytest.raises(TypeError):
+        Simulation(monitor=ColumnarMonitor(),
+                   windows=WindowedMetrics(4, [].append))
+
+
+def test_patience_deadlines_leave_the_queue() -> None:
+    """Test that patience deadlines are kept by the dispatcher, not queued,
+    and that riders still cancel when they run out of patience"""
+
+    queue = RecordingQueue()
+    monitor = Monitor()
+    Simulation(events=queue, monitor=monitor).run(
+        create_event_list("events.txt"))
+    assert queue.added and queue.added_at('Cancellation') == []
+    assert finished_riders(monitor)[1] == 1
+
+    dispatcher = Dispatcher()
+    rider = Rider('Ann', Location(0, 0), Location(1, 1), 3)
+    assert RiderRequest(5, rider).do(dispatcher, Monitor()) == []
+    assert dispatcher.expired(8, -1) == []
+    [cancellation] = dispatcher.expired(9, -1)
+    assert isinstance(cancellation, Cancellation)
+    assert cancellation.timestamp == 8 and cancellation.rider is rider
+
+
+def test_queue_bounded_by_drivers_under_cancellations() -> None:
+    """Test that a streaming run queues at most one event per driver, however
+    many riders cancel"""
+    from workload import Workload
+
+    workload = Workload(rows=40, columns=40, drivers=5, riders=2000,
+                        arrival_rate=3.0, patience=2.0, seed=5)
+    queue = RecordingQueue()
+    monitor = StreamingMonitor()
+    report = Simulation(events=queue, monitor=monitor).run(
+        workload.events(), streaming=True)
+    assert report == Simulation().run(list(workload.events()))
+    assert 0 < queue.peak <= workload.drivers
+
+
+def test_batch_dispatch() -> None:
+    """Test that a batch dispatcher assigns riders only at the end of each
+    dispatch interval, optimally for small batches and greedily otherwise,
+    and that it is benchmarked against the per-event dispatcher"""
+    from benchmarks import compare_dispatch
+    from dispatcher import BatchDispatcher
+    from workload import Workload
+
+    dispatcher = BatchDispatcher(4)
+    monitor = Monitor()
+    events = RecordingQueue()
+    Simulation(events=events, monitor=monitor, dispatcher=dispatcher).run(
+        list(Workload(rows=20, columns=20, drivers=6, riders=300,
+                      seed=1).events()))
+    dispatches = events.added_at('Dispatch')
+    assert finished_riders(monitor)[0] > 0 and dispatches
+    assert all(timestamp % 4 == 0 for timestamp in dispatches)
+    assert len(set(dispatches)) == len(dispatches)
+    assert dispatcher.waiting_count() == 0
+
+    def total_time(optimal_limit: int) -> int:
+        batch = BatchDispatcher(optimal_limit=optimal_limit)
+        rand = random.Random(7)
+        batch.register_drivers(
+            [Driver('D{}'.format(number),
+                    Location(rand.randrange(30), rand.randrange(30)), 1)
+             for number in range(8)])
+        for number in range(12):
+            batch.request_driver(Rider(
+                'R{}'.format(number),
+                Location(rand.randrange(30), rand.randrange(30)),
+                Location(0, 0), 5))
+        pairs = batch.dispatch()
+        assert len(pairs) == 8 and len({driver for _, driver in pairs}) == 8
+        assert batch.waiting_count() == 4 and batch.idle_count() == 0
+        return sum(driver.get_travel_time(rider.origin)
+                   for rider, driver in pairs)
+
+    assert total_time(optimal_limit=1000) <= total_time(optimal_limit=0)
+
+    results = compare_dispatch(300, [2])
+    assert set(results) == {'per_event', 'batch_2'}
+    assert all(result['rider_wait_time'] >= 0 for result in results.values())
+
+
+def test_batch_run_from_generator() -> None:
+    """Test that a run that is not streaming accepts a generator of events,
+    and gives the same results as a run on the list of them"""
+    from workload import Workload
+
+    expected = Simulation().run(create_event_list("events.txt"))
+    assert Simulation().run(iter_events("events.txt")) == expected
+    workload = Workload(rows=20, columns=20, drivers=5, riders=200, seed=2)
+    assert Simulation().run(workload.events()) == \
+        Simulation().run(list(workload.events()))
+
+
 if __name__ == "__main__":
     pytest.main(['sample_tests.py'])
@@ -1,10 +1,15 @@
 """Starting point for simulation"""
 
-from typing import List, Dict
-from container import PriorityQueue
+from time import perf_counter
+from typing import Iterable, Iterator, List, Dict, Optional
+from checkpoint import Checkpointer, load_checkpoint
+from container import Container, CalendarQueue
 from dispatcher import Dispatcher
-from event import Event, create_event_list
+from event import Event, DriverRequest, create_event_list, \
+    next_sequence, advance_sequence
 from monitor import Monitor
+from profiler import Profiler, POP, DO, PUSH, NOTIFY
+from windows import WindowedMetrics, WAITING_RIDERS, IDLE_DRIVERS
 
 
 class Simulation:
@@ -13,20 +18,18 @@ class Simulation:
     This is the class that is responsible for setting up and running a
     simulation.
 
-    The API is given to you: your main task is to implement the run
-    method below according to its docstring.
+    Its public interface is the constructor, the run method and the resume
+    classmethod. The constructor's parameters and run's streaming flag are
+    all optional, and their defaults give the behaviour of the original
+    simulation, which auto-testing relies on: Simulation().run(events)
+    returns the same statistics it always has.
 
-    Of course, you may add whatever private attributes and methods you want.
-    But because you should not change the interface, you may not add any public
-    attributes or methods.
-
-    This is the entry point into your program, and in particular is used for
-    auto-testing purposes. This makes it ESSENTIAL that you do not change the
-    interface in any way!
+    This is the entry point into the program. Add any further state as
+    private attributes and methods, so that this interface stays stable.
     """
 
     # === Private Attributes ===
-    _events: PriorityQueue
+    _events: Container
     #     A sequence of events arranged in priority determined by the event
     #     sorting order.
     _dispatcher: Dispatcher
@@ -34,48 +37,308 @@ class Simulation:
     _monitor: Monitor
 
     #     The monitor associated with the simulation.
+    _profiler: Optional[Profiler]
+    #     The profiler that instruments the run, or None if it is not
+    #     instrumented.
+    _checkpointer: Optional[Checkpointer]
+    #     The checkpointer that saves the simulation during the run, or None
+    #     if no checkpoints are saved.
+    _windows: Optional[WindowedMetrics]
+    #     The windowed metrics the monitor feeds during the run, or None if
+    #     no windows are kept.
 
-    def __init__(self) -> None:
+    def __init__(self, events: Optional[Container] = None,
+                 monitor: Optional[Monitor] = None,
+                 profiler: Optional[Profiler] = None,
+                 checkpointer: Optional[Checkpointer] = None,
+                 windows: Optional[WindowedMetrics] = None,
+                 dispatcher: Optional[Dispatcher] = None) -> None:
         """Initialize a Simulation.
 
+        events: An empty Container to schedule events in, removing them in
+            timestamp order with FIFO ties. Defaults to a CalendarQueue;
+            a PriorityQueue gives the same results. Besides the initial
+            events not done yet, it holds at most one event per driver,
+            and one Dispatch: patience deadlines are kept by the dispatcher
+            instead.
+        monitor: A new Monitor to record activities with. Defaults to a
+            Monitor, which keeps every activity; a StreamingMonitor gives
+            the same report in constant memory per actor.
+        profiler: A Profiler to record the time spent in each phase of
+            each event class, and the queue depth, while the simulation
+            runs. The run is not instrumented if it is None.
+        checkpointer: A Checkpointer to save the whole simulation with,
+            every checkpointer.interval events of a run that is not
+            streaming. No checkpoints are saved if it is None.
+        windows: A new WindowedMetrics to summarize the wait times and leg
+            distances the monitor observes, and the numbers of waiting
+            riders and idle drivers, over windows of simulated time while
+            the simulation runs. It is closed at the end of the run. The
+            monitor must not be a ColumnarMonitor.
+        dispatcher: A new Dispatcher to assign riders and drivers with.
+            Defaults to a Dispatcher, which assigns them at each request; a
+            BatchDispatcher assigns them in batches at fixed intervals.
+        """
+        self._events = CalendarQueue() if events is None else events
+        self._dispatcher = Dispatcher() if dispatcher is None else dispatcher
+        self._monitor = Monitor() if monitor is None else monitor
+        self._profiler = profiler
+        self._checkpointer = checkpointer
+        self._windows = windows
+        if windows is not None:
+            self._monitor.add_observer(windows.observe)
+            windows.probe(WAITING_RIDERS, self._dispatcher.waiting_count)
+            windows.probe(IDLE_DRIVERS, self._dispatcher.idle_count)
+
+    def __getstate__(self) -> dict:
+        """Return the state of this Simulation for a checkpoint, without
+        its profiler and checkpointer.
+
+        """
+        state = self.__dict__.copy()
+        state['_profiler'] = None
+        state['_checkpointer'] = None
+        state['_sequence'] = next_sequence()
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        """Restore this Simulation from a checkpoint, numbering the events
+        created from now on after those in the checkpoint.
+
+        """
+        advance_sequence(state.pop('_sequence'))
+        self.__dict__.update(state)
+
+    @classmethod
+    def resume(cls, filename: str, profiler: Optional[Profiler] = None,
+               checkpointer: Optional[Checkpointer] = None) -> 'Simulation':
+        """Return the Simulation saved in the checkpoint file <filename>.
+
+        Running it on an empty list of events finishes the saved run, and
+        returns the same statistics the run would have returned had it
+        never been stopped.
+
+        profiler: A Profiler to instrument the rest of the run with, or
+            None.
+        checkpointer: A Checkpointer to keep saving the rest of the run
+            with, or None.
         """
-        self._events = PriorityQueue()
-        self._dispatcher = Dispatcher()
-        self._monitor = Monitor()
+        simulation = load_checkpoint(filename)
+        simulation._profiler = profiler
+        simulation._checkpointer = checkpointer
+        return simulation
 
-    def run(self, initial_events: List[Event]) -> Dict[str, float]:
+    def run(self, initial_events: Iterable[Event],
+            streaming: bool = False) -> Dict[str, float]:
         """Run the simulation on the list of events in <initial_events>.
 
         Return a dictionary containing statistics of the simulation,
         according to the specifications in the assignment handout.
 
-        initial_events: An initial list of events.
+        initial_events: An initial list of events, or any other iterable
+            of them, such as a generator.
+        streaming: If True, <initial_events> may be any iterable, such as
+            event.iter_events, and is consumed lazily: each input event is
+            pulled only once it is the next event due, so memory is bounded
+            by the events in flight rather than the size of the input.
+            The results are the same as running on the whole list.
+
+        Precondition: if <streaming> is True, <initial_events> is sorted by
+        timestamp.
         """
+        if streaming and self._checkpointer is not None:
+            raise ValueError('a streaming run cannot be checkpointed')
+        if streaming:
+            self._run(iter(initial_events))
+            return self._finish()
 
-        # Add all initial events to the event queue.
-        for event in initial_events:
-            self._events.add(event)
+        # Add all initial events to the event queue in one batch.
+        self._load(initial_events)
+        if self._checkpointer is not None:
+            self._run_checkpointed()
+        else:
+            self._run(None)
+        return self._finish()
 
-        # Until there are no more events, remove an event
-        # from the event queue and do it. Add any returned
-        # events to the event queue.
+    def _finish(self) -> Dict[str, float]:
+        """Do the cancellations still due once every event is done, close
+        the windowed metrics, if any, and return the statistics of the
+        simulation.
+
+        """
+        for deadline in self._dispatcher.pop_deadlines():
+            deadline.do(self._dispatcher, self._monitor)
+        if self._windows is not None:
+            self._windows.close()
+        return self._monitor.report()
+
+    def _run_checkpointed(self) -> None:
+        """Do every queued event, saving a checkpoint after every
+        checkpointer.interval events and once the queue is empty.
+
+        """
+        checkpointer = self._checkpointer
         while not self._events.is_empty():
-            r_event = self._events.remove()
-            result = r_event.do(self._dispatcher, self._monitor)
+            self._run(None, checkpointer.interval)
+            checkpointer.save(self)
+        checkpointer.wait()
 
-            if result:
-                for event in result:
-                    self._events.add(event)
+    def _run(self, source: Optional[Iterator[Event]],
+             limit: Optional[int] = None) -> None:
+        """Do every queued event, merged with the events from <source> if it
+        is not None, and every event they spawn. Stop early once <limit>
+        events are done, if <limit> is not None.
 
-        return self._monitor.report()
+        The run is instrumented if the simulation has a profiler.
+        """
+        if self._profiler is not None:
+            self._run_profiled(source, limit)
+            return
+
+        # Until there are no more events, take the next event, do the
+        # cancellations due before it, and do it. Add any returned
+        # events to the event queue.
+        events = self._events
+        dispatcher = self._dispatcher
+        monitor = self._monitor
+        pending = None if source is None else next(source, None)
+        count = 0
+        while (pending is not None or not events.is_empty()) and \
+                count != limit:
+            r_event, expired, pending = self._take(pending, source)
+            for deadline in expired:
+                deadline.do(dispatcher, monitor)
+            self._schedule(r_event.do(dispatcher, monitor))
+            count += 1
+
+    def _take(self, pending: Optional[Event],
+              source: Optional[Iterator[Event]]) -> tuple:
+        """Return the next event to do, the cancellations due before it, in
+        order, and the input event that is pending after it.
+
+        <pending> is the next input event from <source>, or None if there
+        is none. An input event is done before any queued event or deadline
+        with the same timestamp. This is the order a batch run gives, where
+        all initial events are queued before any event is spawned.
+        """
+        events = self._events
+        if pending is not None and \
+                (events.is_empty() or
+                 pending.timestamp <= events.peek().timestamp):
+            # Input events come before every deadline at their time.
+            return (pending, self._dispatcher.expired(pending.timestamp, -1),
+                    next(source, None))
+        r_event = events.remove()
+        return (r_event,
+                self._dispatcher.expired(r_event.timestamp, r_event.sequence),
+                pending)
+
+    def _schedule(self, result: Optional[List[Event]]) -> None:
+        """Add the events in <result>, spawned by an event, to the event
+        queue.
+
+        """
+        if result:
+            for event in result:
+                self._events.add(event)
+
+    def _run_profiled(self, source: Optional[Iterator[Event]],
+                      limit: Optional[int] = None) -> None:
+        """Do events exactly as _run does, recording each phase in the
+        profiler.
+
+        Cancellations that fall due are timed as doing a Cancellation, and
+        finding them is timed as part of popping the next event. The
+        monitor's notify method is replaced by a timed one for the length of
+        the run.
+        """
+        events = self._events
+        dispatcher = self._dispatcher
+        monitor = self._monitor
+        profiler = self._profiler
+        notify = monitor.notify
+        interval = profiler.depth_interval
+        phases = {}
+        count = 0
+
+        def timings_of(event: Event) -> list:
+            """Return the pop, do and push Timings of the class of <event>,
+            and time the notifications it makes.
+            """
+            name = type(event).__name__
+            timings = phases.get(name)
+            if timings is None:
+                timings = phases[name] = \
+                    [profiler.timing(name, phase) for phase in (POP, DO, PUSH)]
+                timings.append(profiler.timed(
+                    notify, profiler.timing(name, NOTIFY)))
+            monitor.notify = timings[3]
+            return timings
+
+        pending = None if source is None else next(source, None)
+        try:
+            while (pending is not None or not events.is_empty()) and \
+                    count != limit:
+                start = perf_counter()
+                r_event, expired, pending = self._take(pending, source)
+                popped = perf_counter()
+
+                for deadline in expired:
+                    timings = timings_of(deadline)
+                    deadline_start = perf_counter()
+                    deadline.do(dispatcher, monitor)
+                    timings[1].add(perf_counter() - deadline_start)
+
+                timings = timings_of(r_event)
+                started = perf_counter()
+                result = r_event.do(dispatcher, monitor)
+                done = perf_counter()
+
+                self._schedule(result)
+                timings[0].add(popped - start)
+                timings[1].add(done - started)
+                timings[2].add(perf_counter() - done)
+
+                count += 1
+                if count % interval == 0:
+                    profiler.sample_depth(r_event.timestamp, len(events))
+        finally:
+            if 'notify' in vars(monitor):
+                del monitor.notify
+
+    def _load(self, initial_events: Iterable[Event]) -> None:
+        """Add all of <initial_events> to the event queue in one batch.
+
+        <initial_events> may be any iterable, such as a generator: it is
+        read once, into a list, since every event is queued anyway.
+
+        The drivers of the DriverRequests that open the run (those at the
+        earliest timestamp, before any other kind of event at that time)
+        are registered with the dispatcher in bulk. No rider can be waiting
+        when they are done, so their requests only register them.
+        """
+        initial_events = list(initial_events)
+        self._events.extend(initial_events)
+        if not initial_events:
+            return
+
+        first = min(event.timestamp for event in initial_events)
+        drivers = []
+        for event in initial_events:
+            if event.timestamp == first:
+                if not isinstance(event, DriverRequest):
+                    break
+                drivers.append(event.driver)
+        self._dispatcher.register_drivers(drivers)
 
 
 if __name__ == "__main__":
     import python_ta
     python_ta.check_all(
         config={
-            'extra-imports': ['typing', 'container', 'dispatcher', 'event',
-                              'monitor']})
+            'extra-imports': ['time', 'typing', 'checkpoint', 'container',
+                              'dispatcher', 'event', 'monitor', 'profiler',
+                              'windows']})
 
     events = create_event_list("events.txt")
     sim = Simulation()
@@ -0,0 +1,166 @@
+"""Quantile sketches for the simulation statistics"""
+
+from __future__ import annotations
+from math import ceil, log
+from typing import Dict, Iterable
+
+
+class QuantileSketch:
+    """A mergeable summary of a stream of numbers that answers quantile
+    queries in bounded memory.
+
+    Values are counted in buckets whose bounds grow geometrically in size,
+    so every quantile is estimated within <relative_accuracy> of a value in
+    the stream, whatever the number of values. Zero has its own bucket, and
+    negative values are bucketed by their size in a separate store. Two
+    sketches with the same accuracy can be merged into a sketch of both
+    streams, for example to combine parallel runs.
+
+    === Attributes ===
+    relative_accuracy: The relative error bound of quantile estimates.
+    count: The number of values added.
+    total: The sum of the values added.
+    """
+
+    relative_accuracy: float
+    count: int
+    total: float
+
+    # === Private Attributes ===
+    _gamma: float
+    #     The ratio between the bounds of consecutive buckets.
+    _log_gamma: float
+    #     The natural logarithm of _gamma.
+    _buckets: Dict[int, int]
+    #     The number of positive values in each non-empty bucket. Bucket i
+    #     holds the values in (_gamma ** (i - 1), _gamma ** i].
+    _negatives: Dict[int, int]
+    #     The number of negative values in each non-empty bucket. Bucket i
+    #     holds the values in [-_gamma ** i, -_gamma ** (i - 1)).
+    _zeros: int
+    #     The number of values equal to zero.
+    _min: float
+    #     The smallest value added, or infinity if there is none.
+    _max: float
+    #     The largest value added, or minus infinity if there is none.
+
+    def __init__(self, relative_accuracy: float = 0.01) -> None:
+        """Initialize an empty QuantileSketch.
+
+        Precondition: 0 < relative_accuracy < 1
+        """
+        self.relative_accuracy = relative_accuracy
+        self.count = 0
+        self.total = 0
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = log(self._gamma)
+        self._buckets = {}
+        self._negatives = {}
+        self._zeros = 0
+        self._min = float('inf')
+        self._max = float('-inf')
+
+    def __len__(self) -> int:
+        """Return the number of values added to this QuantileSketch.
+
+        """
+        return self.count
+
+    def add(self, value: float, count: int = 1) -> None:
+        """Add <value> to this QuantileSketch <count> times.
+
+        """
+        if value == 0:
+            self._zeros += count
+        else:
+            buckets = self._buckets if value > 0 else self._negatives
+            index = ceil(log(abs(value)) / self._log_gamma)
+            buckets[index] = buckets.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        self._min = min(self._min, value)
+        self._max = max(self._max, value)
+
+    def extend(self, values: Iterable[float]) -> None:
+        """Add every value in <values> to this QuantileSketch.
+
+        """
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: QuantileSketch) -> None:
+        """Add every value summarized by <other> to this QuantileSketch.
+
+        >>> first, second = QuantileSketch(), QuantileSketch()
+        >>> first.extend([1, 2, 3])
+        >>> second.extend([0, 100])
+        >>> first.merge(second)
+        >>> len(first), first.quantile(0), first.quantile(1)
+        (5, 0, 100)
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('cannot merge sketches of different accuracy')
+        for index, count in other._buckets.items():
+            self._buckets[index] = self._buckets.get(index, 0) + count
+        for index, count in other._negatives.items():
+            self._negatives[index] = self._negatives.get(index, 0) + count
+        self._zeros += other._zeros
+        self.count += other.count
+        self.total += other.total
+        self._min = min(self._min, other._min)
+        self._max = max(self._max, other._max)
+
+    def quantile(self, q: float) -> float:
+        """Return an estimate of the <q>-quantile of the values added, or
+        nan if there are none.
+
+        Precondition: 0 <= q <= 1
+
+        >>> sketch = QuantileSketch()
+        >>> sketch.extend(range(-10, 91))
+        >>> abs(sketch.quantile(0.05) + 5) <= 0.05
+        True
+        >>> abs(sketch.quantile(0.5) - 40) <= 0.4
+        True
+        >>> abs(sketch.quantile(0.99) - 89) <= 0.89
+        True
+        """
+        if self.count == 0:
+            return float('nan')
+        if q <= 0:
+            return self._min
+        if q >= 1:
+            return self._max
+
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self._negatives, reverse=True):
+            seen += self._negatives[index]
+            if rank < seen:
+                return self._clamp(-self._estimate(index))
+        seen += self._zeros
+        if rank < seen:
+            return 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if rank < seen:
+                return self._clamp(self._estimate(index))
+        return self._max
+
+    def _estimate(self, index: int) -> float:
+        """Return the value that represents the positive bucket <index>.
+
+        """
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def _clamp(self, value: float) -> float:
+        """Return <value>, moved into the range of the values added.
+
+        """
+        return min(max(value, self._min), self._max)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={'extra-imports': ['math', 'typing']})
@@ -0,0 +1,252 @@
+"""Spatial index of drivers for the simulation"""
+
+from typing import Dict, Iterator, List, Optional, Tuple
+from driver import Driver
+from location import Location
+
+
+class DriverGrid:
+    """A uniform grid over driver locations, used to find the driver that
+    can reach a location the fastest without scanning every driver.
+
+    The grid is divided into square cells of <cell_size> rows and columns.
+    A query searches the cells in rings of growing distance around the
+    query location, and stops as soon as no driver in a further ring could
+    arrive sooner than the best driver found so far.
+
+    Ties in travel time go to the driver that was added to the grid first.
+    """
+
+    # === Private Attributes ===
+    _cell_size: int
+    #     The number of rows and columns covered by one cell.
+    _cells: Dict[Tuple[int, int], Dict[int, Driver]]
+    #     The drivers in each occupied cell, keyed by the id() of the
+    #     driver.
+    _cell_of: Dict[int, Tuple[int, int]]
+    #     The cell each driver in the grid is filed under, keyed by the id()
+    #     of the driver.
+    _rank: Dict[int, int]
+    #     The order in which drivers were first added to the grid, keyed by
+    #     the id() of the driver. Ranks are kept after a driver is removed.
+    _ranked: List[Driver]
+    #     Every driver ever added to the grid, in the order of their rank.
+    _max_speed: int
+    #     The highest speed of any driver ever added to the grid.
+    _bounds: Optional[Tuple[int, int, int, int]]
+    #     The lowest and highest row and column of any cell ever occupied,
+    #     or None if no driver was ever added.
+    #
+    # === Representation Invariants ===
+    # _cell_of has exactly the ids of the drivers in _cells.
+    # _rank maps the id() of _ranked[i] to i, for every i.
+    # Every cell in _cells is non-empty.
+
+    def __init__(self, cell_size: int = 8) -> None:
+        """Initialize an empty DriverGrid with cells of <cell_size> rows and
+        columns.
+
+        Precondition: cell_size >= 1
+        """
+        self._cell_size = cell_size
+        self._cells = {}
+        self._cell_of = {}
+        self._rank = {}
+        self._ranked = []
+        self._max_speed = 0
+        self._bounds = None
+
+    def __getstate__(self) -> dict:
+        """Return the state of this DriverGrid for pickling, with the
+        drivers in place of their id(), which differs once unpickled.
+
+        """
+        state = self.__dict__.copy()
+        state['_cells'] = {cell: list(drivers.values())
+                           for cell, drivers in self._cells.items()}
+        del state['_cell_of'], state['_rank']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        """Restore this DriverGrid from the pickled <state>.
+
+        >>> import pickle
+        >>> grid = DriverGrid(2)
+        >>> grid.add(Driver('Ana', Location(9, 9), 1))
+        >>> grid.add(Driver('Bo', Location(0, 3), 1))
+        >>> copy = pickle.loads(pickle.dumps(grid))
+        >>> len(copy), copy.fastest(Location(1, 1)).id
+        (2, 'Bo')
+        """
+        self.__dict__.update(state)
+        self._cells = {}
+        self._cell_of = {}
+        for cell, drivers in state['_cells'].items():
+            self._cells[cell] = {id(driver): driver for driver in drivers}
+            for driver in drivers:
+                self._cell_of[id(driver)] = cell
+        self._rank = {id(driver): rank
+                      for rank, driver in enumerate(self._ranked)}
+
+    def __len__(self) -> int:
+        """Return the number of drivers in this DriverGrid.
+
+        >>> grid = DriverGrid()
+        >>> grid.add(Driver('Ana', Location(1, 1), 1))
+        >>> len(grid)
+        1
+        """
+        return len(self._cell_of)
+
+    def __contains__(self, driver: Driver) -> bool:
+        """Return True iff <driver> is in this DriverGrid.
+
+        """
+        return id(driver) in self._cell_of
+
+    def __iter__(self) -> Iterator[Driver]:
+        """Return an iterator over the drivers in this DriverGrid, in the
+        order they were first added.
+
+        >>> grid = DriverGrid(2)
+        >>> grid.add(Driver('Ana', Location(9, 9), 1))
+        >>> grid.add(Driver('Bo', Location(0, 3), 1))
+        >>> [driver.id for driver in grid]
+        ['Ana', 'Bo']
+        """
+        return iter(sorted((driver for drivers in self._cells.values()
+                            for driver in drivers.values()),
+                           key=lambda driver: self._rank[id(driver)]))
+
+    def _cell(self, location: Location) -> Tuple[int, int]:
+        """Return the cell that contains <location>.
+
+        """
+        return (location.row // self._cell_size,
+                location.column // self._cell_size)
+
+    def add(self, driver: Driver) -> None:
+        """Add <driver> to this DriverGrid at its current location, or move
+        it there if it is already in the grid.
+
+        """
+        key = id(driver)
+        cell = self._cell(driver.location)
+        old_cell = self._cell_of.get(key)
+        if old_cell == cell:
+            return
+        if old_cell is not None:
+            self._discard(key, old_cell)
+
+        self._cells.setdefault(cell, {})[key] = driver
+        self._cell_of[key] = cell
+        if key not in self._rank:
+            self._rank[key] = len(self._ranked)
+            self._ranked.append(driver)
+        self._max_speed = max(self._max_speed, driver.speed)
+
+        if self._bounds is None:
+            self._bounds = (cell[0], cell[0], cell[1], cell[1])
+        else:
+            low_row, high_row, low_col, high_col = self._bounds
+            self._bounds = (min(low_row, cell[0]), max(high_row, cell[0]),
+                            min(low_col, cell[1]), max(high_col, cell[1]))
+
+    def remove(self, driver: Driver) -> None:
+        """Remove <driver> from this DriverGrid, if it is in the grid.
+
+        """
+        key = id(driver)
+        cell = self._cell_of.get(key)
+        if cell is not None:
+            self._discard(key, cell)
+            del self._cell_of[key]
+
+    def _discard(self, key: int, cell: Tuple[int, int]) -> None:
+        """Remove the driver with id() <key> from <cell>.
+
+        """
+        drivers = self._cells[cell]
+        del drivers[key]
+        if not drivers:
+            del self._cells[cell]
+
+    def fastest(self, location: Location) -> Optional[Driver]:
+        """Return the driver in this DriverGrid that can reach <location>
+        the fastest, or None if the grid is empty.
+
+        No driver is modified.
+
+        >>> grid = DriverGrid(2)
+        >>> grid.add(Driver('Ana', Location(9, 9), 1))
+        >>> grid.add(Driver('Bo', Location(0, 3), 1))
+        >>> grid.add(Driver('Cy', Location(3, 0), 1))
+        >>> grid.fastest(Location(1, 1)).id
+        'Bo'
+        """
+        if not self._cells:
+            return None
+
+        center_row, center_col = self._cell(location)
+        low_row, high_row, low_col, high_col = self._bounds
+        last_ring = max(center_row - low_row, high_row - center_row,
+                        center_col - low_col, high_col - center_col)
+
+        best = None
+        best_key = None
+        ring = 0
+        while ring <= last_ring:
+            if best_key is not None and ring > 0:
+                # Every location in this ring is at least this far away.
+                nearest = (ring - 1) * self._cell_size + 1
+                if round(nearest / self._max_speed) > best_key[0]:
+                    break
+
+            if 8 * ring >= len(self._cells):
+                # The ring has more cells than the grid has occupied cells,
+                # so visit the remaining occupied cells directly.
+                cells = [drivers for (row, col), drivers in self._cells.items()
+                         if max(abs(row - center_row),
+                                abs(col - center_col)) >= ring]
+                ring = last_ring
+            else:
+                cells = self._ring(center_row, center_col, ring)
+
+            for drivers in cells:
+                for key, driver in drivers.items():
+                    candidate = (driver.get_travel_time(location),
+                                 self._rank[key])
+                    if best_key is None or candidate < best_key:
+                        best = driver
+                        best_key = candidate
+            ring += 1
+        return best
+
+    def _ring(self, center_row: int, center_col: int, ring: int) -> list:
+        """Return the occupied cells exactly <ring> cells away from the cell
+        at (<center_row>, <center_col>).
+
+        """
+        if ring == 0:
+            cell = self._cells.get((center_row, center_col))
+            return [] if cell is None else [cell]
+
+        cells = []
+        for col in range(center_col - ring, center_col + ring + 1):
+            for row in (center_row - ring, center_row + ring):
+                cell = self._cells.get((row, col))
+                if cell is not None:
+                    cells.append(cell)
+        for row in range(center_row - ring + 1, center_row + ring):
+            for col in (center_col - ring, center_col + ring):
+                cell = self._cells.get((row, col))
+                if cell is not None:
+                    cells.append(cell)
+        return cells
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(
+        config={'extra-imports': ['typing', 'driver', 'location']})
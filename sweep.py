@@ -0,0 +1,134 @@
+"""
+The sweep module runs a simulation for every combination of a grid of
+scenario parameters, in parallel, and collects the reports into a table.
+
+The parameters are the number of drivers, a multiplier for every driver's
+speed and a scale for every rider's patience. Each configuration is
+derived from the base trace, which is parsed once and shipped to each
+worker process once; the workers are reused for every configuration.
+"""
+
+import csv
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from typing import Dict, List, Optional, Sequence, Tuple
+from binary_trace import DRIVER_REQUEST, Record, read_trace
+from replication import init_worker, simulate_records, worker_trace
+
+PARAMETERS = ('drivers', 'speed_multiplier', 'patience_scale')
+
+
+def derive_records(records: List[Record], ids: List[str],
+                   drivers: Optional[int] = None,
+                   speed_multiplier: float = 1.0,
+                   patience_scale: float = 1.0
+                   ) -> Tuple[List[Record], List[str]]:
+    """Return the records and id table of a scenario derived from <records>
+    and their id table <ids>.
+
+    drivers: The number of drivers to keep, or None to keep them all. If it
+        is larger than the number of drivers in <records>, the drivers are
+        cloned in order, and clone k of a driver is named '<id>#<k>'.
+    speed_multiplier: The factor applied to every driver's speed. Speeds
+        are rounded, and are at least 1.
+    patience_scale: The factor applied to every rider's patience.
+        Patiences are rounded.
+
+    Raise ValueError if <drivers> is positive but <records> has no
+    DriverRequest to clone the drivers from.
+
+    >>> records = [(0, DRIVER_REQUEST, 0, 1, 1, 0, 0, 2), \
+                   (0, DRIVER_REQUEST, 1, 2, 2, 0, 0, 3)]
+    >>> derive_records(records, ['A', 'B'], 3, 1.5)
+    ([(0, 0, 0, 1, 1, 0, 0, 3), (0, 0, 1, 2, 2, 0, 0, 4), \
+(0, 0, 2, 1, 1, 0, 0, 3)], ['A', 'B', 'A#1'])
+    """
+    driver_records = [record for record in records
+                      if record[1] == DRIVER_REQUEST]
+    if drivers is None:
+        drivers = len(driver_records)
+    if drivers > 0 and not driver_records:
+        raise ValueError('cannot clone {} drivers from a trace without any '
+                         'DriverRequest'.format(drivers))
+    ids = list(ids)
+    kept = driver_records[:drivers]
+    for clone in range(len(driver_records), drivers):
+        record = driver_records[clone % len(driver_records)]
+        kept.append(record[:2] + (len(ids),) + record[3:])
+        ids.append('{}#{}'.format(ids[record[2]],
+                                  clone // len(driver_records)))
+
+    derived = []
+    kept = iter(kept)
+    for record in records:
+        if record[1] == DRIVER_REQUEST:
+            record = next(kept, None)
+            if record is None:
+                continue
+            value = max(1, round(record[7] * speed_multiplier))
+        else:
+            value = max(0, round(record[7] * patience_scale))
+        derived.append(record[:7] + (value,))
+    # The clones are left over; they keep the timestamps of the drivers they
+    # copy, and Simulation.run puts them in timestamp order.
+    derived.extend(record[:7] + (max(1, round(record[7] * speed_multiplier)),)
+                   for record in kept)
+    return derived, ids
+
+
+def sweep(filename: str, drivers: Sequence[Optional[int]] = (None,),
+          speed_multipliers: Sequence[float] = (1.0,),
+          patience_scales: Sequence[float] = (1.0,),
+          output: Optional[str] = None,
+          max_workers: Optional[int] = None) -> List[Dict[str, float]]:
+    """Simulate every combination of <drivers>, <speed_multipliers> and
+    <patience_scales> on the trace in <filename>, in parallel across
+    <max_workers> processes, and return one row per combination.
+
+    Each row holds the parameters, named as in PARAMETERS, followed by the
+    statistics of the report. If <output> is given, the rows are also
+    written to it as a CSV table. See derive_records for the meaning of the
+    parameters.
+
+    filename: A text or binary trace.
+    """
+    configurations = list(product(drivers, speed_multipliers,
+                                  patience_scales))
+    with ProcessPoolExecutor(max_workers, initializer=init_worker,
+                             initargs=(read_trace(filename),)) as executor:
+        reports = list(executor.map(_simulate, configurations))
+
+    rows = []
+    for configuration, report in zip(configurations, reports):
+        row = dict(zip(PARAMETERS, configuration))
+        row.update(report)
+        rows.append(row)
+
+    if output is not None:
+        with open(output, 'w', newline='') as file:
+            writer = csv.DictWriter(file, list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    return rows
+
+
+def _simulate(configuration: Tuple[Optional[int], float, float]
+              ) -> Dict[str, float]:
+    """Return the report of a simulation of the base trace of this process,
+    derived with the parameters in <configuration>.
+
+    """
+    trace = worker_trace()
+    records, ids = derive_records(list(trace.records()), trace.ids(),
+                                  *configuration)
+    return simulate_records(records, ids)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(
+        config={
+            'allowed-io': ['sweep'],
+            'extra-imports': ['csv', 'concurrent.futures', 'itertools',
+                              'typing', 'binary_trace', 'replication']})
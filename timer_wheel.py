@@ -0,0 +1,221 @@
+"""Hierarchical timer wheel for the simulation"""
+
+from typing import Dict, Hashable, List, Tuple
+
+
+class TimerWheel:
+    """A set of timers, each an event that is due at its timestamp, kept in
+    a hierarchical timer wheel.
+
+    Every timer has a key, and can be cancelled by its key in constant
+    time. The wheel has levels of 2 ** <bits> slots each: a slot of level 0
+    holds the timers due at one time, and a slot of level L the timers due
+    in a span of 2 ** (bits * L) times. As the wheel's clock reaches a
+    span, its timers cascade to the lower levels. Advancing the clock takes
+    constant amortized time per timer per level, and skips over spans
+    without timers.
+
+    Timers due at the same time expire in the order of their events'
+    sequence numbers.
+    """
+
+    # === Private Attributes ===
+    _bits: int
+    #     The base 2 logarithm of the number of slots per level.
+    _mask: int
+    #     The number of slots per level, minus one.
+    _levels: List[List[Dict[Hashable, object]]]
+    #     The slots of each level, each holding its timers' events by key.
+    _counts: List[int]
+    #     The number of timers in each level.
+    _slot_of: Dict[Hashable, Tuple[int, int]]
+    #     The level and slot of each timer, by key.
+    _now: int
+    #     The time of the wheel's clock.
+    _floor: float
+    #     No timer due at _now has a lower sequence number than this.
+    #
+    # === Representation Invariants ===
+    # Every timer is due at or after _now.
+    # A timer at level L > 0 is due in the same span of
+    # 2 ** (_bits * (L + 1)) times as _now, but in a later slot of level L.
+
+    def __init__(self, bits: int = 6) -> None:
+        """Initialize an empty TimerWheel with 2 ** <bits> slots per level,
+        and its clock at time 0.
+
+        Precondition: bits >= 1
+        """
+        self._bits = bits
+        self._mask = (1 << bits) - 1
+        self._levels = []
+        self._counts = []
+        self._slot_of = {}
+        self._now = 0
+        self._floor = float('-inf')
+
+    def __len__(self) -> int:
+        """Return the number of timers in this TimerWheel.
+
+        """
+        return len(self._slot_of)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Return True iff this TimerWheel has a timer for <key>.
+
+        """
+        return key in self._slot_of
+
+    def add(self, key: Hashable, event: object) -> None:
+        """Set a timer for <key> that is due at the timestamp of <event>,
+        replacing any timer for <key>.
+
+        Precondition: <event> has a timestamp and a sequence, and its
+        timestamp is not before the time of any earlier call to expire.
+        """
+        self.discard(key)
+        self._place(key, event)
+
+    def _place(self, key: Hashable, event: object) -> None:
+        """Put the timer for <key> in the slot for the timestamp of <event>.
+
+        """
+        time = max(event.timestamp, self._now)
+        differ = time ^ self._now
+        level = (differ.bit_length() - 1) // self._bits if differ else 0
+        while len(self._levels) <= level:
+            self._levels.append([{} for _ in range(self._mask + 1)])
+            self._counts.append(0)
+
+        index = (time >> (self._bits * level)) & self._mask
+        if time == self._now:
+            self._floor = min(self._floor, event.sequence)
+        self._levels[level][index][key] = event
+        self._counts[level] += 1
+        self._slot_of[key] = (level, index)
+
+    def discard(self, key: Hashable) -> None:
+        """Cancel the timer for <key>, if there is one.
+
+        >>> class Timeout:
+        ...     def __init__(self, timestamp, sequence):
+        ...         self.timestamp, self.sequence = timestamp, sequence
+        >>> wheel = TimerWheel()
+        >>> wheel.add('a', Timeout(5, 0))
+        >>> wheel.discard('a')
+        >>> wheel.discard('b')
+        >>> len(wheel), wheel.expire(10, 0)
+        (0, [])
+        """
+        place = self._slot_of.pop(key, None)
+        if place is not None:
+            level, index = place
+            del self._levels[level][index][key]
+            self._counts[level] -= 1
+
+    def expire(self, timestamp: int, sequence: int) -> List[object]:
+        """Remove and return the events of the timers due before the event
+        with <timestamp> and <sequence>, in the order they are due: those
+        due before <timestamp>, and those due at <timestamp> with a lower
+        sequence number.
+
+        The clock of the wheel is advanced to <timestamp>.
+
+        >>> class Timeout:
+        ...     def __init__(self, timestamp, sequence):
+        ...         self.timestamp, self.sequence = timestamp, sequence
+        >>> wheel = TimerWheel(2)
+        >>> for key, timestamp, sequence in [('a', 70, 1), ('b', 3, 2),
+        ...                                  ('c', 70, 0), ('d', 9, 3)]:
+        ...     wheel.add(key, Timeout(timestamp, sequence))
+        >>> [(e.timestamp, e.sequence) for e in wheel.expire(9, 3)]
+        [(3, 2)]
+        >>> [(e.timestamp, e.sequence) for e in wheel.expire(70, 1)]
+        [(9, 3), (70, 0)]
+        >>> [(e.timestamp, e.sequence) for e in wheel.expire(71, 0)]
+        [(70, 1)]
+        """
+        if timestamp == self._now and sequence <= self._floor:
+            # Nothing is due yet: the usual case for a run of events with
+            # the same timestamp.
+            return []
+
+        expired = []
+        levels, counts = self._levels, self._counts
+        while self._slot_of:
+            slot = levels[0][self._now & self._mask]
+            if slot:
+                if self._now < timestamp:
+                    due = list(slot.items())
+                else:
+                    due = [(key, event) for key, event in slot.items()
+                           if event.sequence < sequence]
+                for key, _ in due:
+                    del slot[key]
+                    del self._slot_of[key]
+                counts[0] -= len(due)
+                due.sort(key=lambda timer: timer[1].sequence)
+                expired.extend(event for _, event in due)
+            if self._now >= timestamp:
+                self._floor = min((event.sequence for event in slot.values()),
+                                  default=float('inf'))
+                return expired
+            if not self._slot_of:
+                break
+
+            level = 0
+            while not counts[level]:
+                level += 1
+            if level == 0:
+                self._now += 1
+            else:
+                span = self._bits * level
+                following = ((self._now >> span) + 1) << span
+                if following > timestamp:
+                    # No timer is due in between.
+                    self._now = timestamp
+                    continue
+                self._now = following
+            self._cascade()
+
+        if self._now < timestamp:
+            self._now = timestamp
+            self._floor = float('inf')
+        return expired
+
+    def _cascade(self) -> None:
+        """Move the timers of every slot whose span starts at the wheel's
+        clock to the lower levels.
+
+        """
+        for level in range(len(self._levels) - 1, 0, -1):
+            span = self._bits * level
+            if self._now & ((1 << span) - 1) == 0:
+                index = (self._now >> span) & self._mask
+                slot = self._levels[level][index]
+                if slot:
+                    self._levels[level][index] = {}
+                    self._counts[level] -= len(slot)
+                    for key, event in slot.items():
+                        self._place(key, event)
+
+    def pop_all(self) -> List[object]:
+        """Remove and return the events of every timer, in the order they
+        are due.
+
+        """
+        events = [event for slots in self._levels for slot in slots
+                  for event in slot.values()]
+        events.sort(key=lambda event: (event.timestamp, event.sequence))
+        for slots in self._levels:
+            for slot in slots:
+                slot.clear()
+        self._counts = [0] * len(self._levels)
+        self._slot_of.clear()
+        return events
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={'extra-imports': ['typing']})
@@ -0,0 +1,323 @@
+"""
+The windows module summarizes the metrics of a simulation over windows of
+simulated time while it runs, and passes each window to a sink as soon as it
+closes.
+
+Windows are built from panes: consecutive, non-overlapping spans of <slide>
+units of time. A window covers the latest <width> // <slide> panes, and a
+new window closes every time a pane does. Tumbling windows, which do not
+overlap, are the special case where <slide> equals <width>. Every metric of
+a pane is kept in a mergeable QuantileSketch, so a closing window only
+merges the sketches of its panes, and the history is never scanned again.
+
+A window is a dictionary with its 'start' and 'end' times (windows that
+would start before time 0 start at 0) and, for each
+metric, the number of samples, their mean, their quantiles and their
+maximum, with keys such as 'rider_wait_time_mean' and
+'rider_wait_time_p95'. The statistics of a metric with no samples in the
+window are None.
+
+=== Constants ===
+WAITING_RIDERS: The name of the number of riders on the waiting list.
+IDLE_DRIVERS: The name of the number of registered drivers that are idle.
+METRICS: The names of the metrics of a simulation, in the order of the
+    columns of a window.
+"""
+
+import csv
+import json
+from collections import deque
+from typing import Callable, Dict, List, Optional, Sequence, TextIO, Tuple
+from monitor import WAIT_TIME, DEADHEAD_DISTANCE, RIDE_DISTANCE
+from sketch import QuantileSketch
+
+WAITING_RIDERS = "waiting_riders"
+IDLE_DRIVERS = "idle_drivers"
+
+METRICS = (WAIT_TIME, DEADHEAD_DISTANCE, RIDE_DISTANCE, WAITING_RIDERS,
+           IDLE_DRIVERS)
+
+Window = Dict[str, Optional[float]]
+
+
+class WindowedMetrics:
+    """Summaries of metrics over sliding or tumbling windows of simulated
+    time.
+
+    Metrics are either observed, one sample at a time, or probed: a probe is
+    a function that returns the current value of a metric, and is sampled
+    every time a sample of another metric is observed.
+
+    === Attributes ===
+    width: The length of a window, in units of simulated time.
+    slide: The time between the ends of two consecutive windows.
+    sink: The function called with each window as it closes.
+    metrics: The names of the metrics summarized in each window.
+    quantiles: The quantiles of each metric summarized in each window.
+
+    === Representation Invariants ===
+    width is a positive multiple of slide.
+    """
+
+    width: int
+    slide: int
+    sink: Callable[[Window], None]
+    metrics: Sequence[str]
+    quantiles: Tuple[float, ...]
+
+    # === Private Attributes ===
+    _probes: List[Tuple[str, Callable[[], float]]]
+    #     The name and probe of every probed metric.
+    _pane: int
+    #     The index of the current pane, which covers the times from
+    #     _pane * slide up to but not including (_pane + 1) * slide.
+    _current: Dict[str, QuantileSketch]
+    #     The samples of each metric in the current pane.
+    _closed: deque
+    #     The samples of each metric in the panes before the current one
+    #     that are still in a window, oldest first.
+
+    def __init__(self, width: int, sink: Callable[[Window], None],
+                 slide: Optional[int] = None,
+                 metrics: Sequence[str] = METRICS,
+                 quantiles: Tuple[float, ...] = (0.5, 0.95, 0.99)) -> None:
+        """Initialize WindowedMetrics with windows of <width> units of time,
+        one every <slide> units, or tumbling windows if <slide> is None.
+        Each window is passed to <sink> as it closes, for example
+        list.append, a CsvSink or a JsonLinesSink.
+
+        Precondition: width >= 1, and width is a multiple of slide.
+        """
+        self.width = width
+        self.slide = width if slide is None else slide
+        self.sink = sink
+        self.metrics = metrics
+        self.quantiles = quantiles
+        self._probes = []
+        self._pane = 0
+        self._current = {}
+        self._closed = deque(maxlen=width // self.slide - 1)
+
+    def probe(self, name: str, probe: Callable[[], float]) -> None:
+        """Sample the metric <name> by calling <probe> whenever a sample of
+        another metric is observed.
+
+        """
+        self._probes.append((name, probe))
+
+    def observe(self, timestamp: int, name: str, value: float) -> None:
+        """Record the sample <value> of the metric <name> at <timestamp>,
+        and sample every probe.
+
+        Windows that end at or before <timestamp> are closed first.
+
+        Precondition: <timestamp> is not earlier than that of any earlier
+        sample.
+
+        >>> windows = []
+        >>> metrics = WindowedMetrics(10, windows.append, metrics=['wait'],
+        ...                           quantiles=())
+        >>> metrics.observe(3, 'wait', 2)
+        >>> metrics.observe(8, 'wait', 4)
+        >>> metrics.observe(25, 'wait', 9)
+        >>> windows
+        [{'start': 0, 'end': 10, 'wait_count': 2, 'wait_mean': 3.0, \
+'wait_max': 4}]
+        """
+        self.advance(timestamp)
+        self._add(name, value)
+        for probed, probe in self._probes:
+            self._add(probed, probe())
+
+    def _add(self, name: str, value: float) -> None:
+        """Add the sample <value> of the metric <name> to the current pane.
+
+        """
+        sketch = self._current.get(name)
+        if sketch is None:
+            sketch = self._current[name] = QuantileSketch()
+        sketch.add(value)
+
+    def advance(self, timestamp: int) -> None:
+        """Close every window that ends at or before <timestamp>.
+
+        """
+        pane = timestamp // self.slide
+        while self._pane < pane:
+            if not self._current and not any(self._closed):
+                # Every window up to <timestamp> would be empty.
+                self._closed.clear()
+                self._pane = pane
+                return
+            self._close_pane()
+
+    def flush(self) -> None:
+        """Close the current pane, and every window that holds samples
+        taken so far.
+
+        """
+        while self._current or any(self._closed):
+            self._close_pane()
+
+    def _close_pane(self) -> None:
+        """Close the current pane, and pass the window that ends with it to
+        the sink if it holds any samples.
+
+        """
+        panes = list(self._closed) + [self._current]
+        if any(panes):
+            end = (self._pane + 1) * self.slide
+            self.sink(self._summarize(max(end - self.width, 0), end, panes))
+        self._closed.append(self._current)
+        self._current = {}
+        self._pane += 1
+
+    def _summarize(self, start: int, end: int,
+                   panes: List[Dict[str, QuantileSketch]]) -> Window:
+        """Return the window from <start> to <end> over the samples in
+        <panes>.
+
+        """
+        window = {'start': start, 'end': end}
+        for name in self.metrics:
+            sketch = QuantileSketch()
+            for pane in panes:
+                if name in pane:
+                    sketch.merge(pane[name])
+            window[name + '_count'] = sketch.count
+            window[name + '_mean'] = \
+                sketch.total / sketch.count if sketch.count else None
+            for q in self.quantiles:
+                window['{}_p{:g}'.format(name, q * 100)] = \
+                    sketch.quantile(q) if sketch.count else None
+            window[name + '_max'] = sketch.quantile(1) if sketch.count \
+                else None
+        return window
+
+    def close(self) -> None:
+        """Flush every window, and close the sink if it can be closed.
+
+        """
+        self.flush()
+        close = getattr(self.sink, 'close', None)
+        if close is not None:
+            close()
+
+
+class _FileSink:
+    """A sink that writes windows to a text file.
+
+    The file is reopened when the sink is unpickled, for example when a
+    simulation is resumed from a checkpoint, and cut back to its length when
+    the sink was pickled, so that windows written after the checkpoint are
+    not written twice.
+
+    === Attributes ===
+    filename: The file the windows are written to.
+    """
+
+    filename: str
+
+    # === Private Attributes ===
+    _file: TextIO
+    #     The open file.
+
+    def __init__(self, filename: str) -> None:
+        """Initialize a sink that writes to <filename>, replacing it.
+
+        """
+        self.filename = filename
+        self._file = open(filename, 'w', newline='')
+
+    def __getstate__(self) -> dict:
+        """Return the state of this sink for pickling, with the length of
+        its file in place of the file.
+
+        """
+        self._file.flush()
+        state = self.__dict__.copy()
+        del state['_file']
+        state['_offset'] = self._file.tell()
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        """Restore this sink from the pickled <state>.
+
+        """
+        offset = state.pop('_offset')
+        self.__dict__.update(state)
+        self._file = open(self.filename, 'a', newline='')
+        self._file.truncate(offset)
+
+    def close(self) -> None:
+        """Close the file.
+
+        """
+        self._file.close()
+
+
+class CsvSink(_FileSink):
+    """A sink that writes windows to a CSV file, one row per window, after
+    a header row.
+
+    """
+
+    # === Private Attributes ===
+    _writer: Optional[csv.DictWriter]
+    #     The writer of rows to the file, or None if no row was written yet.
+
+    def __init__(self, filename: str) -> None:
+        """Initialize a CsvSink that writes to <filename>, replacing it.
+
+        """
+        _FileSink.__init__(self, filename)
+        self._writer = None
+
+    def __getstate__(self) -> dict:
+        """Return the state of this sink for pickling, without its file.
+
+        """
+        state = _FileSink.__getstate__(self)
+        state['_writer'] = None if self._writer is None \
+            else self._writer.fieldnames
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        """Restore this sink from the pickled <state>.
+
+        """
+        fields = state['_writer']
+        _FileSink.__setstate__(self, state)
+        if fields is not None:
+            self._writer = csv.DictWriter(self._file, fields)
+
+    def __call__(self, window: Window) -> None:
+        """Write <window> to the file.
+
+        """
+        if self._writer is None:
+            self._writer = csv.DictWriter(self._file, list(window))
+            self._writer.writeheader()
+        self._writer.writerow(window)
+
+
+class JsonLinesSink(_FileSink):
+    """A sink that writes windows to a file as JSON objects, one per line.
+
+    """
+
+    def __call__(self, window: Window) -> None:
+        """Write <window> to the file.
+
+        """
+        self._file.write(json.dumps(window) + '\n')
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(
+        config={
+            'allowed-io': ['__init__', '__setstate__'],
+            'extra-imports': ['csv', 'json', 'collections', 'typing',
+                              'monitor', 'sketch']})
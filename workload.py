@@ -0,0 +1,202 @@
+"""
+The workload module generates synthetic traces of DriverRequest and
+RiderRequest events at any scale, for load testing the simulation.
+
+Events are generated lazily and in timestamp order, so they can be written
+to a text trace or fed to a streaming Simulation.run without ever holding
+the whole trace in memory.
+
+A workload is made of:
+- A fleet of drivers, all requesting a rider at time 0 from uniformly
+  random locations, each with a speed drawn uniformly from a range.
+- A stream of riders arriving as a Poisson process. Their origins are
+  drawn from a mix of hotspots and a uniform background, their
+  destinations uniformly, and their patience from a shifted exponential
+  distribution.
+"""
+
+from math import floor
+from random import Random
+from typing import Iterator, Optional, Sequence, Tuple
+from driver import Driver
+from event import Event, DriverRequest, RiderRequest
+from location import intern_location
+from rider import Rider
+
+Request = Tuple[int, str, str, int, int, int, int, int]
+
+
+class Hotspot:
+    """An area of the grid where riders are more likely to request a ride.
+
+    Origins drawn from a hotspot are normally distributed around its centre.
+
+    === Attributes ===
+    row: The row of the centre of the hotspot.
+    column: The column of the centre of the hotspot.
+    weight: The share of riders drawn from this hotspot, relative to the
+        other hotspots and the background weight of the workload.
+    spread: The standard deviation of the distance of origins from the
+        centre, in rows and columns.
+    """
+
+    row: int
+    column: int
+    weight: float
+    spread: float
+
+    def __init__(self, row: int, column: int, weight: float = 1.0,
+                 spread: float = 3.0) -> None:
+        """Initialize a Hotspot.
+
+        """
+        self.row = row
+        self.column = column
+        self.weight = weight
+        self.spread = spread
+
+
+class Workload:
+    """The parameters of a synthetic workload.
+
+    === Attributes ===
+    rows: The number of rows in the grid.
+    columns: The number of columns in the grid.
+    drivers: The number of drivers.
+    riders: The number of riders.
+    arrival_rate: The average number of riders arriving per unit of time.
+    hotspots: The hotspots riders may come from.
+    background: The share of riders with uniformly random origins,
+        relative to the weights of the hotspots.
+    patience: The average patience of a rider.
+    min_patience: The smallest patience of a rider.
+    speeds: The lowest and highest speed of a driver.
+    seed: The seed of the random number generator.
+    """
+
+    rows: int
+    columns: int
+    drivers: int
+    riders: int
+    arrival_rate: float
+    hotspots: Sequence[Hotspot]
+    background: float
+    patience: float
+    min_patience: int
+    speeds: Tuple[int, int]
+    seed: int
+
+    def __init__(self, rows: int = 100, columns: int = 100,
+                 drivers: int = 100, riders: int = 1000,
+                 arrival_rate: float = 1.0,
+                 hotspots: Sequence[Hotspot] = (),
+                 background: float = 1.0, patience: float = 15.0,
+                 min_patience: int = 1, speeds: Tuple[int, int] = (1, 3),
+                 seed: int = 0) -> None:
+        """Initialize a Workload.
+
+        Precondition: rows >= 1, columns >= 1, arrival_rate > 0,
+        patience >= min_patience, and 1 <= speeds[0] <= speeds[1].
+        """
+        self.rows = rows
+        self.columns = columns
+        self.drivers = drivers
+        self.riders = riders
+        self.arrival_rate = arrival_rate
+        self.hotspots = hotspots
+        self.background = background
+        self.patience = patience
+        self.min_patience = min_patience
+        self.speeds = speeds
+        self.seed = seed
+
+    def requests(self) -> Iterator[Request]:
+        """Yield the requests of this workload in timestamp order, as
+        (timestamp, event type, id, row, column, row, column, value) tuples.
+
+        For a DriverRequest the second location is (0, 0) and the value is
+        the speed; for a RiderRequest they are the destination and the
+        patience. The same workload always yields the same requests.
+        """
+        rand = Random(self.seed)
+        for number in range(self.drivers):
+            yield (0, 'DriverRequest', 'Driver{}'.format(number),
+                   rand.randrange(self.rows), rand.randrange(self.columns),
+                   0, 0, rand.randint(*self.speeds))
+
+        weights = [self.background] + [hotspot.weight
+                                       for hotspot in self.hotspots]
+        sources = [None] + list(self.hotspots)
+        extra_patience = self.patience - self.min_patience
+        time = 0.0
+        for number in range(self.riders):
+            time += rand.expovariate(self.arrival_rate)
+            row, column = self._origin(
+                rand, rand.choices(sources, weights)[0])
+            patience = self.min_patience
+            if extra_patience > 0:
+                patience += floor(rand.expovariate(1 / extra_patience))
+            yield (floor(time), 'RiderRequest', 'Rider{}'.format(number),
+                   row, column, rand.randrange(self.rows),
+                   rand.randrange(self.columns), patience)
+
+    def _origin(self, rand: Random,
+                hotspot: Optional[Hotspot]) -> Tuple[int, int]:
+        """Return the row and column of an origin drawn from <hotspot>, or
+        uniformly from the grid if <hotspot> is None.
+
+        """
+        if hotspot is None:
+            return rand.randrange(self.rows), rand.randrange(self.columns)
+        row = round(rand.gauss(hotspot.row, hotspot.spread))
+        column = round(rand.gauss(hotspot.column, hotspot.spread))
+        return (min(max(row, 0), self.rows - 1),
+                min(max(column, 0), self.columns - 1))
+
+    def events(self) -> Iterator[Event]:
+        """Yield the events of this workload in timestamp order.
+
+        >>> events = Workload(drivers=2, riders=3).events()
+        >>> [type(event).__name__ for event in events]
+        ['DriverRequest', 'DriverRequest', 'RiderRequest', 'RiderRequest', \
+'RiderRequest']
+        """
+        for timestamp, kind, identifier, row, column, row2, column2, value \
+                in self.requests():
+            if kind == 'DriverRequest':
+                yield DriverRequest(timestamp, Driver(
+                    identifier, intern_location(row, column), value))
+            else:
+                yield RiderRequest(timestamp, Rider(
+                    identifier, intern_location(row, column),
+                    intern_location(row2, column2), value))
+
+    def write(self, filename: str) -> int:
+        """Write this workload to <filename> as a text trace, one event at a
+        time, and return the number of events written.
+
+        """
+        count = 0
+        with open(filename, 'w') as file:
+            for timestamp, kind, identifier, row, column, row2, column2, \
+                    value in self.requests():
+                if kind == 'DriverRequest':
+                    file.write('{} {} {} {},{} {}\n'.format(
+                        timestamp, kind, identifier, row, column, value))
+                else:
+                    file.write('{} {} {} {},{} {},{} {}\n'.format(
+                        timestamp, kind, identifier, row, column, row2,
+                        column2, value))
+                count += 1
+        return count
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(
+        config={
+            'allowed-io': ['write'],
+            'max-args': 12,
+            'extra-imports': ['math', 'random', 'typing', 'driver', 'event',
+                              'location', 'rider']})